@@ -1,8 +1,13 @@
 
 import streamlit as st
 import pandas as pd
-import pathlib, json, re
-from datetime import datetime
+import pathlib, json
+
+from src.interface.dashboard_data import typed_frame, KeywordIndex
+from src.pipeline.storage import list_snapshots, load_snapshot, snapshot_file
+from src.pipeline.search_index import open_index
+from src.pipeline.diff import load_changes
+from src.pipeline.history import HistoryStore
 
 st.set_page_config(page_title="Dual-Source Scraper — Dashboard", layout="wide")
 st.title("Dual-Source Web Scraper — Streamlit 介面 (C)")
@@ -13,6 +18,8 @@ st.title("Dual-Source Web Scraper — Streamlit 介面 (C)")
 snap_dir = pathlib.Path("data/snapshots")
 diff_dir = pathlib.Path("data/diffs")
 chart_dir = pathlib.Path("data/charts")
+index_path = pathlib.Path("data/index/search.db")
+history_path = pathlib.Path("data/history/history.db")
 
 snap_dir.mkdir(parents=True, exist_ok=True)
 diff_dir.mkdir(parents=True, exist_ok=True)
@@ -32,39 +39,19 @@ def _read_csv_safe(path: pathlib.Path) -> pd.DataFrame:
         df["pk"] = df["source"].astype(str) + "::" + df["id"].astype(str)
     return df
 
-def _parse_date_col(df: pd.DataFrame) -> pd.DataFrame:
-    if "date" in df.columns:
-        # accept YYYYMMDD, YYYY-MM-DD, or other; coerce invalid to NaT
-        def _to_dt(x:str):
-            x = str(x).strip()
-            for fmt in ("%Y%m%d", "%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d"):
-                try:
-                    return datetime.strptime(x, fmt)
-                except Exception:
-                    pass
-            return pd.NaT
-        df["_date_dt"] = df["date"].map(_to_dt)
-    return df
+# 快照 DataFrame 與關鍵字索引以 (快照名稱, 檔案 mtime) 為 key 快取，
+# 只有檔案變動（重新 scrape / clean）時才重新讀取與計算；之後每次互動只做篩選。
+# 用 cache_resource 避免每次 rerun 複製整份資料 → 呼叫端不可原地修改回傳的 DataFrame。
+@st.cache_resource(show_spinner="載入快照中…", max_entries=4)
+def _load_typed_snapshot(name: str, mtime: float) -> pd.DataFrame:
+    return typed_frame(load_snapshot(str(snap_dir), name))
 
-def _to_price_num(s: str) -> float:
-    # keep digits and dot minus; e.g., "$1,234.50" -> 1234.50
-    if s is None: return None
-    s = str(s)
-    m = re.findall(r"[-]?\d+(?:[.,]\d+)?", s.replace(",", ""))
-    if not m: return None
-    try:
-        return float(m[0])
-    except Exception:
-        return None
-
-def _ensure_price(df: pd.DataFrame) -> pd.DataFrame:
-    col = "price" if "price" in df.columns else ("value" if "value" in df.columns else None)
-    if col:
-        df["_price_num"] = df[col].map(_to_price_num)
-    return df
+@st.cache_resource(show_spinner="建立關鍵字索引中…", max_entries=4)
+def _keyword_index(name: str, mtime: float) -> KeywordIndex:
+    return KeywordIndex.from_frame(_load_typed_snapshot(name, mtime))
 
-def _latest_snapshot_files() -> list[pathlib.Path]:
-    return sorted(snap_dir.glob("snapshot_*.csv"))
+def _snapshot_mtime(name: str) -> float:
+    return pathlib.Path(snapshot_file(str(snap_dir), name)).stat().st_mtime
 
 def _latest_chart_images() -> list[pathlib.Path]:
     return sorted(chart_dir.glob("summary_*.png"))
@@ -73,17 +60,15 @@ def _latest_chart_images() -> list[pathlib.Path]:
 # Sidebar — source data & filters
 # ---------------------
 st.sidebar.header("資料來源與篩選")
-snaps = _latest_snapshot_files()
+snaps = list_snapshots(str(snap_dir))
 if not snaps:
     st.sidebar.info("找不到快照（data/snapshots/snapshot_*.csv）。\n請先執行 CLI：\n\n`python -m src.interface.cli scrape ...`")
-selected_snap = st.sidebar.selectbox("選擇快照檔", options=[s.name for s in snaps], index=len(snaps)-1 if snaps else 0)
+selected_snap = st.sidebar.selectbox("選擇快照檔", options=snaps, index=len(snaps)-1 if snaps else 0)
 
 df = pd.DataFrame()
 if snaps:
-    snap_path = snap_dir / selected_snap
-    df = _read_csv_safe(snap_path)
-    df = _parse_date_col(df)
-    df = _ensure_price(df)
+    snap_mtime = _snapshot_mtime(selected_snap)
+    df = _load_typed_snapshot(selected_snap, snap_mtime)
 
     # Basic search & filters
     keyword = st.sidebar.text_input("關鍵字（title / url / author / category）", "")
@@ -113,16 +98,10 @@ if snaps:
     else:
         sel_pmin = sel_pmax = None
 
-    # Apply filters
-    filtered = df.copy()
+    # Apply filters（df 為快取物件，只用索引/遮罩取子集，不原地修改）
+    filtered = df
     if keyword:
-        kw = keyword.lower()
-        hay = pd.Series([""]*len(filtered))
-        for c in ["title", "url", "author", "category"]:
-            if c in filtered.columns:
-                hay = hay + " " + filtered[c].astype(str).str.lower()
-        mask_kw = hay.str.contains(kw, na=False)
-        filtered = filtered[mask_kw]
+        filtered = filtered.iloc[_keyword_index(selected_snap, snap_mtime).search(keyword)]
 
     if "source" in filtered.columns and sel_sources:
         filtered = filtered[filtered["source"].isin(sel_sources)]
@@ -154,7 +133,8 @@ if snaps:
     with c1:
         st.caption("各來源筆數分佈")
         if "source" in filtered.columns:
-            st.bar_chart(filtered["source"].value_counts().sort_values(ascending=False))
+            counts = filtered["source"].value_counts()
+            st.bar_chart(counts[counts > 0].sort_values(ascending=False))
         else:
             st.info("無 source 欄。")
 
@@ -169,7 +149,8 @@ if snaps:
             st.pyplot(fig)
         elif "category" in filtered.columns:
             st.caption("分類前十 (若無價格欄位)")
-            st.bar_chart(filtered["category"].value_counts().head(10))
+            counts = filtered["category"].value_counts()
+            st.bar_chart(counts[counts > 0].head(10))
         else:
             st.info("無價格或分類欄可視覺化。")
 
@@ -194,6 +175,23 @@ if snaps:
         mime="text/csv"
     )
 
+    # ---------------------
+    # Full-text search (BM25, 最新快照)
+    # ---------------------
+    st.subheader("🔎 全文檢索（最新快照，BM25 排序）")
+    query = st.text_input("查詢（支援中文）", "", key="bm25_query")
+    idx = open_index(str(index_path)) if query else None
+    if query and idx is None:
+        st.info("檢索索引尚未建立，請先執行 diff（或 `cli search --rebuild`）。")
+    elif query:
+        if idx.snapshot != snaps[-1]:
+            st.caption(f"索引對應 {idx.snapshot}（最新快照為 {snaps[-1]}，執行 diff 後更新）")
+        hits = idx.search(query, top=50)
+        if hits.empty:
+            st.info("沒有符合的結果。")
+        else:
+            st.dataframe(hits, use_container_width=True, height=300)
+
 # ---------------------
 # Diff summary & images
 # ---------------------
@@ -230,7 +228,8 @@ if summary_path.exists():
         stamp = summary.get("date","")
         new_csv = diff_dir / f"diff_{stamp}_new.csv"
         del_csv = diff_dir / f"diff_{stamp}_deleted.csv"
-        # changed is currently not saved as CSV by pipeline; list is in memory only.
+        # changed 由 pipeline 存成 data/diffs/changes/changes_<run_id>.parquet（long format）
+        run_id = summary.get("run_id", "")
 
         exp = st.expander("查看 New / Deleted 明細（若存在）")
         with exp:
@@ -245,5 +244,40 @@ if summary_path.exists():
                 st.dataframe(_read_csv_safe(del_csv), use_container_width=True, height=200)
             else:
                 st.info("未找到對應的 deleted CSV。")
+
+        exp_c = st.expander("查看 Changed 明細（逐欄位 old → new）")
+        with exp_c:
+            if run_id:
+                st.caption(f"Run: {run_id}")
+                st.dataframe(load_changes(str(diff_dir), run_id=run_id), use_container_width=True, height=200)
+            else:
+                st.info("這份 summary 沒有 run_id（舊版 diff 輸出），請重新執行 diff。")
+            pk_q = st.text_input("查詢單一 pk 的所有修改紀錄", "", key="changes_pk")
+            if pk_q:
+                st.dataframe(load_changes(str(diff_dir), pk=pk_q), use_container_width=True, height=200)
 else:
     st.info("No diff summary yet. 請先執行 `python -m src.interface.cli diff ...` 後再回來看。")
+
+# ---------------------
+# History（由每次 diff 累積的欄位值區間）
+# ---------------------
+st.subheader("📈 歷史查詢")
+if history_path.exists():
+    store = HistoryStore(str(history_path))
+    st.caption(f"歷史資料更新至：{store.as_of or '-'}")
+    h1, h2 = st.columns(2)
+    with h1:
+        pk_h = st.text_input("item pk", "", key="history_pk")
+        if pk_h:
+            hist = store.field_history(pk_h)
+            st.dataframe(hist, use_container_width=True, height=250)
+            price_hist = hist[hist["column"] == "price"]
+            if not price_hist.empty:
+                series = pd.to_numeric(price_hist.set_index("valid_from")["value"], errors="coerce").dropna()
+                if not series.empty:
+                    st.line_chart(series)
+    with h2:
+        days = st.number_input("價格下降（與 N 天前相比）", min_value=1, value=30, step=1)
+        st.dataframe(store.price_drops(days=days), use_container_width=True, height=250)
+else:
+    st.info("尚無歷史資料。執行 `python -m src.interface.cli diff ...` 後會自動建立。")
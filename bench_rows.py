@@ -0,0 +1,48 @@
+# bench_rows.py (放在專案根目錄)
+# 比較 dict 逐列 vs RowBatch 欄式累積的峰值記憶體 (peak RSS)
+# 終端執行 python bench_rows.py [筆數]   （需 Linux / macOS，使用 resource 模組）
+
+import resource, subprocess, sys
+
+FIELDS = ["id", "title", "url", "author", "category", "date", "price"]
+
+def _row(i):
+    return {
+        "id": f"catalogue/book-{i}/index.html",
+        "title": f"Book title number {i}",
+        "url": f"https://books.toscrape.com/catalogue/book-{i}/index.html",
+        "author": "",
+        "category": "",
+        "date": "",
+        "price": f"£{i % 100}.{i % 97:02d}",
+    }
+
+def run(mode: str, n: int):
+    import pandas as pd
+    from src.scraper.rows import RowBatch
+    if mode == "dict":
+        rows = []
+        for i in range(n):
+            row = _row(i)
+            row["source"] = "books_static"
+            rows.append(row)
+        df = pd.DataFrame(rows)
+    else:
+        batch = RowBatch("books_static", FIELDS)
+        for i in range(n):
+            batch.append(_row(i))
+        df = batch.to_frame()
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == "darwin":
+        peak_kb //= 1024
+    print(f"{mode:>8}: rows={len(df)} peak RSS={peak_kb / 1024:.1f} MiB "
+          f"frame={df.memory_usage(deep=True).sum() / 2**20:.1f} MiB")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2:
+        run(sys.argv[1], int(sys.argv[2]))
+    else:
+        n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+        # 各模式分開 process 量測，峰值才不會互相影響
+        for mode in ("dict", "rowbatch"):
+            subprocess.run([sys.executable, __file__, mode, str(n)], check=True)
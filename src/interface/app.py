@@ -1,25 +1,36 @@
-import streamlit as st, pandas as pd, pathlib, json
+import streamlit as st, pathlib, json
+from src.pipeline.search_index import open_index
+from src.pipeline.storage import list_snapshots, load_snapshot, snapshot_file
 
 st.title("Dual-Source Web Scraper – Minimal Interface")
 
 snap_dir = pathlib.Path("data/snapshots")
 diff_dir = pathlib.Path("data/diffs")
 chart_dir = pathlib.Path("data/charts")
+index_path = pathlib.Path("data/index/search.db")
+
+# 還原 delta / 讀全部分片的成本只在快照變動（名稱或 mtime 改變）時付一次，之後每次 rerun 直接取用
+@st.cache_resource(show_spinner="載入快照中…", max_entries=2)
+def _snapshot_head(name: str, mtime: float):
+    return load_snapshot(str(snap_dir), name).head(100)
 
 st.subheader("Latest Snapshot")
-snaps = sorted(snap_dir.glob("snapshot_*.csv"))
+# 依 manifest 列出快照（含分片目錄與壓縮成 delta 的快照）
+snaps = list_snapshots(str(snap_dir))
 if snaps:
     latest = snaps[-1]
-    st.write(f"Latest snapshot: {latest.name}")
-    df = pd.read_csv(latest)
+    st.write(f"Latest snapshot: {latest}")
     q = st.text_input("Keyword search (title/url/author/category):", "")
     if q:
-        mask = False
-        for col in [c for c in df.columns if c in ["title","url","author","category"]]:
-            mask = mask | df[col].fillna("").str.contains(q, case=False, na=False)
-        st.dataframe(df[mask])
+        # 查持久化的 BM25 索引（由 diff 增量更新），頁面上不重建
+        idx = open_index(str(index_path))
+        if idx is None:
+            st.info("Search index not built yet. Run diff first.")
+        else:
+            st.dataframe(idx.search(q, top=100))
     else:
-        st.dataframe(df.head(100))
+        mtime = pathlib.Path(snapshot_file(str(snap_dir), latest)).stat().st_mtime
+        st.dataframe(_snapshot_head(latest, mtime))
 else:
     st.info("No snapshots yet. Run the CLI first.")
 
@@ -1,9 +1,17 @@
-import argparse, yaml, pandas as pd, pathlib, sys
+import argparse, yaml, pandas as pd, pathlib, sys, io, gzip, os, socket, time
+from urllib.parse import urlparse
 from src.scraper.static_scraper import scrape_static
 from src.scraper.dynamic_scraper import scrape_dynamic
-from src.pipeline.clean import clean_df
-from src.pipeline.storage import write_snapshot, latest_two_snapshots
-from src.pipeline.diff import diff_snapshots, write_outputs, chart_summary
+from src.scraper.archive import ResponseArchive, replay_run, new_run_id, prune_runs, ARCHIVE_KEEP
+from src.scraper.rows import concat_frames
+from src.scraper.error_handler import error_source
+from src.pipeline.clean import clean_df, NormCache
+from src.pipeline.storage import (write_snapshot, latest_two_snapshots, list_snapshots, snapshot_file,
+                                  snapshot_name, load_snapshot, compact_snapshots, write_clean)
+from src.pipeline.diff import diff_snapshots, write_outputs, chart_summary, load_csv
+from src.pipeline.jobqueue import open_queue
+from src.pipeline.search_index import update_from_diff, open_index, build_index
+from src.pipeline.history import HistoryStore, update_from_diff as update_history
 
 
 def now_stamp():
@@ -13,41 +21,169 @@ def load_cfg(path: str):
     with open(path, "r", encoding="utf-8") as f:
         return yaml.safe_load(f)
 
+def scrape_source(src: dict, archive=None, parse_workers=None, throttle=None):
+    with error_source(src.get("name")):
+        if src["type"] == "static":
+            return scrape_static(src, archive=archive, parse_workers=parse_workers, throttle=throttle)
+        if src["type"] == "dynamic":
+            return scrape_dynamic(src, archive=archive, throttle=throttle)
+    print(f"Unknown source type: {src['type']}", file=sys.stderr)
+    return None
+
 def scrape_cmd(args):
     cfg = load_cfg(args.config)
+    if args.replay:
+        # 從封存的回應重新擷取，不連網
+        all_df = replay_run(args.replay, cfg["sources"], root=args.archive, workers=args.workers)
+        path = write_snapshot(all_df, args.out, shards=args.shards, shard_by=args.shard_by)
+        print(f"Replayed run {args.replay}: {len(all_df)} rows -> {path}")
+        return
+    archive = None if args.no_archive else ResponseArchive(args.archive)
     frames = []
     for src in cfg["sources"]:
-        if src["type"] == "static":
-            df = scrape_static(src)
-        elif src["type"] == "dynamic":
-            df = scrape_dynamic(src)
-        else:
-            print(f"Unknown source type: {src['type']}", file=sys.stderr); continue
-        frames.append(df)
-    all_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        df = scrape_source(src, archive=archive, parse_workers=args.parse_workers)
+        if df is not None:
+            frames.append(df)
+    all_df = concat_frames(frames) if frames else pd.DataFrame()
     # write raw snapshot pre-clean (optional) or proceed directly to clean in next step
-    path = write_snapshot(all_df, args.out)
+    path = write_snapshot(all_df, args.out, shards=args.shards, shard_by=args.shard_by)
     print(f"Wrote raw snapshot: {path}")
+    if archive is not None:
+        print(f"Archived responses: {archive.dir} (replay with --replay {archive.run_id})")
+        removed = prune_runs(args.archive, keep=args.archive_keep)
+        if removed:
+            print(f"Pruned {len(removed)} old archived run(s), keeping the newest {args.archive_keep}")
+
+def coordinate_cmd(args):
+    """把每個來源當成一個 job 丟進佇列，等 worker 做完後合併成一份快照。"""
+    cfg = load_cfg(args.config)
+    queue = open_queue(args.queue)
+    run_id = args.run or new_run_id()
+    if not args.run:
+        for src in cfg["sources"]:
+            queue.put(run_id, {"source": src})
+        print(f"Enqueued {len(cfg['sources'])} jobs for run {run_id}")
+    elif not queue.run_status(run_id):
+        print(f"Unknown run id: {run_id}", file=sys.stderr); sys.exit(1)
+    if args.no_wait:
+        return
+
+    deadline = time.time() + args.timeout if args.timeout else None
+    while True:
+        status = queue.run_status(run_id)
+        if not status.get("queued") and not status.get("running"):
+            break
+        if deadline and time.time() > deadline:
+            print(f"Timed out waiting for run {run_id}: {status}", file=sys.stderr); sys.exit(1)
+        time.sleep(args.poll)
+
+    # 有來源失敗時不登記快照：缺的來源在下一次 diff 會全部被當成刪除
+    if status.get("failed"):
+        print(f"{status['failed']} job(s) failed in run {run_id}", file=sys.stderr)
+        if not args.allow_partial:
+            print("Not writing a partial snapshot (use --allow-partial to write it anyway)", file=sys.stderr)
+            sys.exit(1)
+    frames = [pd.read_csv(io.BytesIO(gzip.decompress(r)), dtype=str) for r in queue.results(run_id) if r]
+    if not frames:
+        print(f"No results in run {run_id}; no snapshot written", file=sys.stderr); sys.exit(1)
+    all_df = concat_frames(frames)
+    path = write_snapshot(all_df, args.out, shards=args.shards, shard_by=args.shard_by)
+    print(f"Merged {len(frames)} partial result(s) of run {run_id}: {path}")
+
+def worker_cmd(args):
+    """從佇列領 job 來爬，結果（gzip CSV）寫回佇列；所有 worker 共用每個 host 的限速。"""
+    queue = open_queue(args.queue)
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    throttle = lambda url: queue.throttle(urlparse(url).netloc, args.min_interval)
+    idle_since = time.time()
+    while True:
+        job = queue.claim(worker_id, max_attempts=args.max_attempts)
+        if job is None:
+            if args.once or (args.idle_exit and time.time() - idle_since > args.idle_exit):
+                break
+            time.sleep(args.poll)
+            continue
+
+        src = job["payload"]["source"]
+        try:
+            archive = None if args.no_archive else ResponseArchive(args.archive, run_id=job["run_id"])
+            df = scrape_source(src, archive=archive, throttle=throttle)
+            if df is None:
+                raise RuntimeError(f"Unknown source type: {src.get('type')}")
+            queue.complete(job["id"], gzip.compress(df.to_csv(index=False).encode("utf-8")))
+            print(f"[{worker_id}] job {job['id']} ({src['name']}): {len(df)} rows")
+            if archive is not None:
+                prune_runs(args.archive, keep=args.archive_keep)
+        except Exception as e:
+            queue.fail(job["id"], str(e), max_attempts=args.max_attempts)
+            print(f"[{worker_id}] job {job['id']} ({src.get('name')}) failed: {e}", file=sys.stderr)
+        idle_since = time.time()
 
 def clean_cmd(args):
-    p = pathlib.Path(args.snapshots)
-    files = sorted(p.glob("snapshot_*.csv"))
-    if not files:
+    names = list_snapshots(args.snapshots)
+    if not names:
         print("No snapshots found.", file=sys.stderr); sys.exit(1)
-    latest = files[-1]
-    df = pd.read_csv(latest)
-    clean = clean_df(df)
-    clean.to_csv(latest, index=False)
-    print(f"Cleaned snapshot in place: {latest}")
+    # 每次都從原始快照（全部欄位為字串）清理，原始檔不動；結果另存並登記，之後的步驟讀清理後的檔案
+    df = load_csv(snapshot_file(args.snapshots, names[-1], raw=True))
+    # 以原始列內容雜湊快取正規化結果，只有沒看過的列才重新解析日期 / 價格
+    cache = None if args.no_cache else NormCache(args.cache)
+    clean = clean_df(df, cache=cache)
+    path = write_clean(clean, args.snapshots, names[-1])
+    if cache is not None:
+        print(f"Normalized {cache.misses} new rows, reused {cache.hits} cached")
+    print(f"Cleaned snapshot {names[-1]}: {path}")
 
 def diff_cmd(args):
     prev, curr = latest_two_snapshots(args.snapshots)
     if not prev or not curr:
         print("Need at least two snapshots to diff.", file=sys.stderr); sys.exit(1)
-    res = diff_snapshots(prev, curr)
-    summary, summary_path = write_outputs(res, args.diffs)
+    res = diff_snapshots(prev, curr, workers=args.workers)
+    # run_id 取自目前快照的時間戳，修改紀錄依此分批保存
+    run_id = snapshot_name(curr).replace("snapshot_", "")
+    summary, summary_path = write_outputs(res, args.diffs, run_id=run_id)
     chart_path = chart_summary(summary, args.charts)
     print(f"Summary: {summary} \nWrote {summary_path} \nChart: {chart_path}")
+    # 只重建 diff 回報的新增 / 修改列
+    idx = update_from_diff(args.index, prev, curr, res)
+    print(f"Search index: {len(idx)} docs ({args.index})")
+    hist = update_history(args.history, prev, curr, res)
+    print(f"History: as of {hist.as_of} ({args.history})")
+
+def history_cmd(args):
+    store = HistoryStore(args.history)
+    if args.price_drops is not None:
+        out = store.price_drops(days=args.price_drops, column=args.column or "price")
+    elif args.pk:
+        out = store.field_history(args.pk, args.column)
+    else:
+        print("Specify --pk or --price-drops.", file=sys.stderr); sys.exit(1)
+    if out.empty:
+        print("No history found."); return
+    with pd.option_context("display.max_colwidth", 60, "display.width", 200):
+        print(out.to_string(index=False))
+
+def search_cmd(args):
+    idx = build_index(args.index, args.snapshots) if args.rebuild else open_index(args.index)
+    if idx is None:
+        print("Search index not built yet: run diff (or search --rebuild).", file=sys.stderr); sys.exit(1)
+    names = list_snapshots(args.snapshots)
+    if names and idx.snapshot != names[-1]:
+        print(f"Note: index is for {idx.snapshot}, latest snapshot is {names[-1]} (run diff to update)",
+              file=sys.stderr)
+    hits = idx.search(args.query, top=args.top)
+    if hits.empty:
+        print("No results."); return
+    with pd.option_context("display.max_colwidth", 60, "display.width", 200):
+        print(hits[["score", "pk", "title", "author"]].to_string(index=False))
+
+def compact_cmd(args):
+    stats = compact_snapshots(args.snapshots, full_every=args.full_every, keep=args.keep)
+    print(f"Compacted {args.snapshots}: {stats['deltas']} new delta(s), {stats['removed']} snapshot(s) removed")
+
+def restore_cmd(args):
+    df = load_snapshot(args.snapshots, args.name)
+    df.to_csv(args.out, index=False)
+    print(f"Restored {args.name or 'latest'} ({len(df)} rows) -> {args.out}")
 
 def main():
     ap = argparse.ArgumentParser(prog="dual-source-webscraper")
@@ -57,11 +193,48 @@ def main():
     ap_scrape = sub.add_parser("scrape", help="Scrape all configured sources into a new snapshot CSV")
     ap_scrape.add_argument("--config", required=True)
     ap_scrape.add_argument("--out", default="data/snapshots")
+    ap_scrape.add_argument("--shards", type=int, default=None, help="Write the snapshot as N pk-hash shards (parallel load/diff)")
+    ap_scrape.add_argument("--shard-by", choices=["pk", "source"], default="pk", help="Shard by pk hash or by source")
+    ap_scrape.add_argument("--archive", default="data/archive", help="Response archive root")
+    ap_scrape.add_argument("--no-archive", action="store_true", help="Do not archive fetched responses")
+    ap_scrape.add_argument("--archive-keep", type=int, default=ARCHIVE_KEEP,
+                           help=f"Keep only the newest N archived runs (0 = keep all, default {ARCHIVE_KEEP})")
+    ap_scrape.add_argument("--replay", metavar="RUN", help="Re-extract from an archived run (id or dir) without network")
+    ap_scrape.add_argument("--workers", type=int, default=None, help="Parser processes for --replay (default: CPU count)")
+    ap_scrape.add_argument("--parse-workers", type=int, default=None, help="Parser processes for static sources (overrides parse_workers in config)")
     ap_scrape.set_defaults(func=scrape_cmd)
 
+    # coordinate / worker（分散式）
+    ap_coord = sub.add_parser("coordinate", help="Enqueue one job per source, wait for workers, merge into one snapshot")
+    ap_coord.add_argument("--config", required=True)
+    ap_coord.add_argument("--queue", default="sqlite:///data/queue.db", help="sqlite:///path or redis://host:port/db")
+    ap_coord.add_argument("--out", default="data/snapshots")
+    ap_coord.add_argument("--shards", type=int, default=None, help="Write the snapshot as N pk-hash shards")
+    ap_coord.add_argument("--shard-by", choices=["pk", "source"], default="pk")
+    ap_coord.add_argument("--run", help="Resume waiting on / merging an existing run id instead of enqueueing")
+    ap_coord.add_argument("--no-wait", action="store_true", help="Only enqueue jobs")
+    ap_coord.add_argument("--poll", type=float, default=2.0)
+    ap_coord.add_argument("--timeout", type=float, default=None, help="Give up waiting after N seconds")
+    ap_coord.add_argument("--allow-partial", action="store_true", help="Write the snapshot even if some jobs failed")
+    ap_coord.set_defaults(func=coordinate_cmd)
+
+    ap_worker = sub.add_parser("worker", help="Pull scrape jobs from the queue and run them")
+    ap_worker.add_argument("--queue", default="sqlite:///data/queue.db", help="sqlite:///path or redis://host:port/db")
+    ap_worker.add_argument("--min-interval", type=float, default=1.0, help="Shared minimum seconds between requests per host")
+    ap_worker.add_argument("--max-attempts", type=int, default=3)
+    ap_worker.add_argument("--archive", default="data/archive")
+    ap_worker.add_argument("--no-archive", action="store_true")
+    ap_worker.add_argument("--archive-keep", type=int, default=ARCHIVE_KEEP, help="Keep only the newest N archived runs (0 = keep all)")
+    ap_worker.add_argument("--poll", type=float, default=2.0)
+    ap_worker.add_argument("--once", action="store_true", help="Exit as soon as the queue is empty")
+    ap_worker.add_argument("--idle-exit", type=float, default=None, help="Exit after N idle seconds")
+    ap_worker.set_defaults(func=worker_cmd)
+
     # clean
     ap_clean = sub.add_parser("clean", help="Clean latest snapshot (normalize date/price, dedup, last_seen_at)")
     ap_clean.add_argument("--snapshots", default="data/snapshots")
+    ap_clean.add_argument("--cache", default="data/cache/clean.db", help="Normalized-value cache keyed by raw row hash")
+    ap_clean.add_argument("--no-cache", action="store_true", help="Normalize every row (ignore the cache)")
     ap_clean.set_defaults(func=clean_cmd)
 
     # diff
@@ -69,8 +242,42 @@ def main():
     ap_diff.add_argument("--snapshots", default="data/snapshots")
     ap_diff.add_argument("--diffs", default="data/diffs")
     ap_diff.add_argument("--charts", default="data/charts")
+    ap_diff.add_argument("--index", default="data/index/search.db", help="Full-text index updated from the diff")
+    ap_diff.add_argument("--history", default="data/history/history.db", help="Per-field value history updated from the diff")
+    ap_diff.add_argument("--workers", type=int, default=None, help="Processes for diffing matching shards (default: CPU count)")
     ap_diff.set_defaults(func=diff_cmd)
 
+    # search
+    ap_search = sub.add_parser("search", help="BM25 full-text search over the latest snapshot")
+    ap_search.add_argument("query")
+    ap_search.add_argument("--index", default="data/index/search.db")
+    ap_search.add_argument("--snapshots", default="data/snapshots")
+    ap_search.add_argument("--top", type=int, default=10)
+    ap_search.add_argument("--rebuild", action="store_true", help="Rebuild the index from the latest snapshot first")
+    ap_search.set_defaults(func=search_cmd)
+
+    # history
+    ap_hist = sub.add_parser("history", help="Query per-item field history (value intervals) built from diffs")
+    ap_hist.add_argument("--history", default="data/history/history.db")
+    ap_hist.add_argument("--pk", help="Item key, e.g. books_static::catalogue/a-light-in-the-attic_1000/index.html")
+    ap_hist.add_argument("--column", default=None, help="Only this field (default: all; 'price' for --price-drops)")
+    ap_hist.add_argument("--price-drops", type=float, metavar="DAYS", default=None,
+                         help="Items whose current value is lower than DAYS days ago")
+    ap_hist.set_defaults(func=history_cmd)
+
+    # compact / restore
+    ap_compact = sub.add_parser("compact", help="Store older snapshots as full bases + gzip deltas and apply retention")
+    ap_compact.add_argument("--snapshots", default="data/snapshots")
+    ap_compact.add_argument("--full-every", type=int, default=8, help="Keep one full base every N snapshots")
+    ap_compact.add_argument("--keep", type=int, default=None, help="Retain only the newest N snapshots")
+    ap_compact.set_defaults(func=compact_cmd)
+
+    ap_restore = sub.add_parser("restore", help="Reconstruct a (possibly delta-compressed) snapshot to CSV")
+    ap_restore.add_argument("--snapshots", default="data/snapshots")
+    ap_restore.add_argument("--name", default=None, help="Snapshot name, e.g. snapshot_20251015_120000 (default: latest)")
+    ap_restore.add_argument("--out", required=True)
+    ap_restore.set_defaults(func=restore_cmd)
+
     args = ap.parse_args()
     args.func(args)
 
@@ -0,0 +1,90 @@
+import bisect
+
+import numpy as np
+import pandas as pd
+
+from src.pipeline.text import tokenize
+
+DATE_FORMATS = ("%Y%m%d", "%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d")
+KEYWORD_COLS = ["title", "url", "author", "category"]
+
+def typed_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    預先算好 dashboard 需要的欄位（向量化，每份快照只做一次）：
+    pk、_date_dt（日期）、_price_num（價格數值）、source / category 轉 categorical。
+    """
+    df = df.fillna("").copy()
+    if "pk" not in df.columns and {"source", "id"}.issubset(df.columns):
+        df["pk"] = df["source"].astype(str) + "::" + df["id"].astype(str)
+
+    if "date" in df.columns:
+        s = df["date"].astype(str).str.strip()
+        dates = pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns]")
+        for fmt in DATE_FORMATS:
+            dates = dates.fillna(pd.to_datetime(s, format=fmt, errors="coerce"))
+        df["_date_dt"] = dates
+
+    col = "price" if "price" in df.columns else ("value" if "value" in df.columns else None)
+    if col:
+        # "$1,234.50" -> 1234.50（與原本 regex 相同：去逗號後取第一個數字）
+        num = df[col].astype(str).str.replace(",", "", regex=False).str.extract(r"(-?\d+(?:\.\d+)?)")[0]
+        df["_price_num"] = pd.to_numeric(num, errors="coerce")
+
+    for c in ("source", "category"):
+        if c in df.columns:
+            df[c] = df[c].astype(str).astype("category")
+    return df
+
+class KeywordIndex:
+    """
+    關鍵字篩選用的反向索引（token → 列位置）。
+
+    查詢語意與原本的「小寫後子字串比對」相同：先用索引找出每個查詢 token
+    都出現在某個 token 裡的候選列，再只對候選列做子字串確認。
+    """
+
+    def __init__(self, hay: pd.Series):
+        self.hay = hay.reset_index(drop=True)
+        postings = {}
+        for pos, text in enumerate(self.hay):
+            for tok in set(tokenize(text)):
+                postings.setdefault(tok, []).append(pos)
+        self.vocab = sorted(postings)
+        self.postings = [np.asarray(postings[t], dtype=np.int64) for t in self.vocab]
+        self._token_rows = {}
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, cols=KEYWORD_COLS) -> "KeywordIndex":
+        hay = pd.Series([""] * len(df), index=df.index)
+        for c in cols:
+            if c in df.columns:
+                hay = hay + " " + df[c].astype(str).str.lower()
+        return cls(hay)
+
+    def _rows_for_token(self, tok: str) -> np.ndarray:
+        if tok in self._token_rows:
+            return self._token_rows[tok]
+        # 先看前綴範圍（常見情況），再補上 token 出現在詞中間的詞
+        lo = bisect.bisect_left(self.vocab, tok)
+        hi = bisect.bisect_left(self.vocab, tok + "\uffff")
+        ids = list(range(lo, hi)) + [i for i, t in enumerate(self.vocab) if tok in t and not t.startswith(tok)]
+        rows = np.unique(np.concatenate([self.postings[i] for i in ids])) if ids else np.empty(0, dtype=np.int64)
+        self._token_rows[tok] = rows
+        return rows
+
+    def search(self, keyword: str) -> np.ndarray:
+        """回傳符合的列位置（遞增）。"""
+        kw = keyword.lower()
+        toks = set(tokenize(kw))
+        if toks:
+            cand = None
+            for tok in toks:
+                rows = self._rows_for_token(tok)
+                cand = rows if cand is None else np.intersect1d(cand, rows, assume_unique=True)
+                if len(cand) == 0:
+                    return cand
+        else:
+            # 只有標點等無法索引的字元：退回全掃
+            cand = np.arange(len(self.hay))
+        mask = self.hay.iloc[cand].str.contains(kw, regex=False, na=False).to_numpy()
+        return cand[mask]
@@ -1,4 +1,4 @@
-import pandas as pd, re, math
+import pandas as pd, re, math, pathlib, sqlite3
 from dateutil import parser as dtparser
 
 def _is_nan(v) -> bool:
@@ -43,7 +43,61 @@ def to_number(v):
     except Exception:
         return None
 
-def clean_df(df: pd.DataFrame) -> pd.DataFrame:
+CLEAN_CACHE_PATH = "data/cache/clean.db"
+# 不列入內容雜湊的欄位（clean 自己加的）
+_HASH_IGNORE = {"pk", "last_seen_at"}
+
+def row_hashes(df: pd.DataFrame) -> pd.Series:
+    """每列原始內容的 64-bit 雜湊（欄位依名稱排序，跨 run 穩定）；回傳 int64 方便存進 SQLite。"""
+    cols = sorted(c for c in df.columns if c not in _HASH_IGNORE)
+    h = pd.util.hash_pandas_object(df[cols].astype(str), index=False)
+    return pd.Series(h.to_numpy().view("int64"), index=df.index)
+
+class NormCache:
+    """
+    正規化結果的持久快取：原始列雜湊 → (date, price)。
+    每次 clean 只有沒看過的原始列才需要跑 normalize_date / to_number。
+    """
+
+    def __init__(self, path: str = CLEAN_CACHE_PATH):
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS norm (h INTEGER PRIMARY KEY, date TEXT, price REAL)")
+        self.hits = self.misses = 0
+
+    def lookup(self, hashes) -> pd.DataFrame:
+        with self.conn:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS q (h INTEGER PRIMARY KEY)")
+            self.conn.execute("DELETE FROM q")
+            self.conn.executemany("INSERT OR IGNORE INTO q(h) VALUES (?)", ((int(h),) for h in hashes))
+        return pd.read_sql_query("SELECT n.h, n.date, n.price FROM norm n JOIN q USING (h)",
+                                 self.conn, index_col="h")
+
+    def store(self, hashes, dates, prices):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO norm(h, date, price) VALUES (?, ?, ?)",
+                ((int(h), d, None if _is_nan(p) else float(p)) for h, d, p in zip(hashes, dates, prices)),
+            )
+
+def _normalize_cached(df: pd.DataFrame, cache: NormCache):
+    h = row_hashes(df)
+    known = cache.lookup(h.unique())
+    date = h.map(known["date"]).astype(object)
+    price = h.map(known["price"]).astype(float)
+    miss = ~h.isin(known.index)
+    if miss.any():
+        new_date = df.loc[miss, "date"].map(normalize_date)
+        new_price = df.loc[miss, "price"].map(to_number).astype(float)
+        date[miss] = new_date
+        price[miss] = new_price
+        first = ~h[miss].duplicated()
+        cache.store(h[miss][first], new_date[first], new_price[first])
+    cache.hits, cache.misses = int((~miss).sum()), int(miss.sum())
+    df["date"] = date
+    df["price"] = price
+
+def clean_df(df: pd.DataFrame, cache: NormCache = None) -> pd.DataFrame:
     if df is None or df.empty:
         return df if df is not None else pd.DataFrame()
 
@@ -54,9 +108,12 @@ def clean_df(df: pd.DataFrame) -> pd.DataFrame:
         if col not in df.columns:
             df[col] = ""
 
-    # 正規化
-    df["date"] = df["date"].map(normalize_date)
-    df["price"] = df["price"].map(to_number)
+    # 正規化（有 cache 時只處理沒看過的原始列）
+    if cache is not None:
+        _normalize_cached(df, cache)
+    else:
+        df["date"] = df["date"].map(normalize_date)
+        df["price"] = df["price"].map(to_number)
 
     # 複合主鍵、去重
     df["pk"] = df["source"].astype(str) + "::" + df["id"].astype(str)
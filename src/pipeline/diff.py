@@ -1,13 +1,60 @@
-import pandas as pd, json, pathlib, datetime as dt
+import pandas as pd, json, pathlib, datetime as dt, sqlite3, os
+from concurrent.futures import ProcessPoolExecutor
+import pyarrow as pa
 import matplotlib.pyplot as plt
 
+from src.pipeline.storage import read_shards, read_csv_fast, shard_files, shard_scheme
+
+CHANGE_COLS = ["run_id", "pk", "column", "old", "new"]
+CHANGE_SCHEMA = pa.schema([(c, pa.string()) for c in CHANGE_COLS])
+
 def load_csv(path: str) -> pd.DataFrame:
+    # 分片快照（目錄）→ 各分片平行讀取
+    if pathlib.Path(path).is_dir():
+        return read_shards(path)
     return pd.read_csv(path, dtype=str).fillna("")
 
-def diff_snapshots(prev_path: str, curr_path: str):
-    prev = load_csv(prev_path)
-    curr = load_csv(curr_path)
+def diff_snapshots(prev_path: str, curr_path: str, workers: int = None):
+    """
+    兩份快照都是分片目錄、且分片方式相同時，對應的分片在 process pool 中各自 diff 再合併
+    （同一個 pk 一定落在同名分片）；否則整份讀進來比對。
+    """
+    pairs = _shard_pairs(prev_path, curr_path)
+    if pairs is None:
+        return diff_frames(load_csv(prev_path), load_csv(curr_path))
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1 or len(pairs) <= 1:
+        parts = [_diff_shard(p) for p in pairs]
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pairs))) as ex:
+            parts = list(ex.map(_diff_shard, pairs))
+    return {
+        "new": pd.concat([r["new"] for r in parts], ignore_index=True),
+        "deleted": pd.concat([r["deleted"] for r in parts], ignore_index=True),
+        "changed": [c for r in parts for c in r["changed"]],
+    }
+
+def _shard_pairs(prev_path: str, curr_path: str):
+    if not (pathlib.Path(prev_path).is_dir() and pathlib.Path(curr_path).is_dir()):
+        return None
+    scheme = shard_scheme(prev_path)
+    if scheme is None or scheme != shard_scheme(curr_path):
+        return None
+    prev = {f.name: str(f) for f in shard_files(prev_path)}
+    curr = {f.name: str(f) for f in shard_files(curr_path)}
+    return [(prev.get(n), curr.get(n)) for n in sorted(prev.keys() | curr.keys())]
 
+def _diff_shard(pair):
+    # 在子行程執行：自己讀分片檔，只把 diff 結果傳回
+    prev_file, curr_file = pair
+    prev = read_csv_fast(prev_file) if prev_file else None
+    curr = read_csv_fast(curr_file) if curr_file else None
+    # 某個來源只出現在其中一份（依 source 分片時）→ 另一邊視為空表
+    prev = prev if prev is not None else pd.DataFrame(columns=curr.columns)
+    curr = curr if curr is not None else pd.DataFrame(columns=prev.columns)
+    return diff_frames(prev, curr)
+
+def diff_frames(prev: pd.DataFrame, curr: pd.DataFrame):
     # 補 pk
     for df in (prev, curr):
         if "pk" not in df.columns and {"source","id"}.issubset(df.columns):
@@ -39,15 +86,56 @@ def diff_snapshots(prev_path: str, curr_path: str):
         "changed": changed_rows
     }
 
-def write_outputs(diff_res: dict, out_dir: str):
+def changes_frame(changed: list, run_id: str) -> pd.DataFrame:
+    """diff 的 changed 清單攤平成 long format：每個 (pk, 欄位) 一列，依 pk 排序。"""
+    rows = [(run_id, c["pk"], col, d["old"], d["new"])
+            for c in changed for col, d in sorted(c["diffs"].items())]
+    return pd.DataFrame(rows, columns=CHANGE_COLS).sort_values(["pk", "column"], kind="stable").reset_index(drop=True)
+
+def write_changes(changed: list, out_dir: str, run_id: str) -> str:
+    """
+    changed 寫成 changes/changes_<run_id>.parquet（欄式、依 pk 排序），
+    並在 changes/index.sqlite 登記 (pk, run_id)，查單一 item 的修改紀錄只需讀有關的 run。
+    """
+    d = pathlib.Path(out_dir) / "changes"; d.mkdir(parents=True, exist_ok=True)
+    df = changes_frame(changed, run_id)
+    path = d / f"changes_{run_id}.parquet"
+    df.to_parquet(path, index=False, schema=CHANGE_SCHEMA)
+    with sqlite3.connect(d / "index.sqlite") as conn:
+        conn.execute("CREATE TABLE IF NOT EXISTS change_index (pk TEXT NOT NULL, run_id TEXT NOT NULL, PRIMARY KEY (pk, run_id)) WITHOUT ROWID")
+        conn.execute("DELETE FROM change_index WHERE run_id = ?", (run_id,))
+        conn.executemany("INSERT INTO change_index(pk, run_id) VALUES (?, ?)",
+                         [(pk, run_id) for pk in df["pk"].unique()])
+    return str(path)
+
+def load_changes(out_dir: str, pk: str = None, run_id: str = None) -> pd.DataFrame:
+    """讀取持久化的修改紀錄：指定 run_id 讀該次，指定 pk 則透過索引只讀有改過它的 run。"""
+    d = pathlib.Path(out_dir) / "changes"
+    if run_id:
+        runs = [run_id]
+    elif pk and (d / "index.sqlite").exists():
+        with sqlite3.connect(d / "index.sqlite") as conn:
+            runs = [r[0] for r in conn.execute("SELECT run_id FROM change_index WHERE pk = ? ORDER BY run_id", (pk,))]
+    else:
+        runs = sorted(p.stem[len("changes_"):] for p in d.glob("changes_*.parquet"))
+    filters = [("pk", "==", pk)] if pk else None
+    frames = [pd.read_parquet(d / f"changes_{r}.parquet", filters=filters)
+              for r in runs if (d / f"changes_{r}.parquet").exists()]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=CHANGE_COLS)
+
+def write_outputs(diff_res: dict, out_dir: str, run_id: str = None):
     out = pathlib.Path(out_dir); out.mkdir(parents=True, exist_ok=True)
     stamp = dt.datetime.now().strftime("%Y%m%d")
+    run_id = run_id or dt.datetime.now().strftime("%Y%m%d_%H%M%S")
     # write diff CSVs
     diff_res["new"].to_csv(out / f"diff_{stamp}_new.csv", index=False)
     diff_res["deleted"].to_csv(out / f"diff_{stamp}_deleted.csv", index=False)
+    # changed → 欄式 long-format 表（逐次 append）
+    write_changes(diff_res["changed"], out_dir, run_id)
     # summary.json
     summary = {
         "date": stamp,
+        "run_id": run_id,
         "new": int(len(diff_res["new"])),
         "deleted": int(len(diff_res["deleted"])),
         "changed": int(len(diff_res["changed"]))
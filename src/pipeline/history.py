@@ -0,0 +1,154 @@
+import datetime as dt, pathlib, sqlite3
+
+import pandas as pd
+
+from src.pipeline.diff import load_csv, diff_frames
+from src.pipeline.storage import snapshot_name
+
+HISTORY_PATH = "data/history/history.db"
+# 不追蹤歷史的欄位（主鍵本身、每次都會變的時間戳）
+IGNORE_COLS = {"pk", "last_seen_at"}
+
+def snapshot_time(path_or_name: str) -> str:
+    """snapshot_20251015_120000(.csv / .clean.csv) → 2025-10-15T12:00:00（字串可直接比較先後）。"""
+    stem = snapshot_name(path_or_name).replace("snapshot_", "")
+    return dt.datetime.strptime(stem, "%Y%m%d_%H%M%S").strftime("%Y-%m-%dT%H:%M:%S")
+
+class HistoryStore:
+    """
+    每個 item、每個欄位的值區間（SCD type 2）：
+    intervals(pk, column, value, valid_from, valid_to)，valid_to 為 NULL 表示目前值。
+
+    每次 diff 只動到有變化的 (pk, 欄位)：
+    - new：開新區間
+    - deleted：關閉該 pk 所有目前區間
+    - changed：關閉舊值、開新值
+    查詢任一時間點或一段期間的變化都只需查表，不必讀回 N 份快照。
+    """
+
+    def __init__(self, path: str = HISTORY_PATH):
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS intervals (
+                pk TEXT NOT NULL, column TEXT NOT NULL, value TEXT,
+                valid_from TEXT NOT NULL, valid_to TEXT
+            );
+            CREATE INDEX IF NOT EXISTS intervals_pk ON intervals(pk, column, valid_from);
+            CREATE INDEX IF NOT EXISTS intervals_open ON intervals(column, valid_to);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+
+    @property
+    def snapshot(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'snapshot'").fetchone()
+        return row[0] if row else None
+
+    @property
+    def as_of(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'as_of'").fetchone()
+        return row[0] if row else None
+
+    def _mark(self, snapshot: str, at: str):
+        self.conn.executemany("INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)",
+                              [("snapshot", snapshot), ("as_of", at)])
+
+    # ---------------------
+    # 寫入
+    # ---------------------
+    def _open_rows(self, df: pd.DataFrame, at: str):
+        cols = [c for c in df.columns if c not in IGNORE_COLS]
+        self.conn.executemany(
+            "INSERT INTO intervals(pk, column, value, valid_from) VALUES (?, ?, ?, ?)",
+            [(r["pk"], c, r[c], at) for r in df.to_dict("records") for c in cols],
+        )
+
+    def bootstrap(self, df: pd.DataFrame, snapshot: str, at: str):
+        """用第一份快照建立初始狀態。"""
+        with self.conn:
+            self.conn.execute("DELETE FROM intervals")
+            self._open_rows(_with_pk(df).drop_duplicates(subset=["pk"]), at)
+            self._mark(snapshot, at)
+
+    def apply_diff(self, diff_res: dict, snapshot: str, at: str):
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE intervals SET valid_to = ? WHERE pk = ? AND valid_to IS NULL",
+                [(at, pk) for pk in diff_res["deleted"]["pk"]],
+            )
+            self._open_rows(diff_res["new"], at)
+            cells = [(c["pk"], col, d["new"]) for c in diff_res["changed"]
+                     for col, d in c["diffs"].items() if col not in IGNORE_COLS]
+            self.conn.executemany(
+                "UPDATE intervals SET valid_to = ? WHERE pk = ? AND column = ? AND valid_to IS NULL",
+                [(at, pk, col) for pk, col, _ in cells],
+            )
+            self.conn.executemany(
+                "INSERT INTO intervals(pk, column, value, valid_from) VALUES (?, ?, ?, ?)",
+                [(pk, col, val, at) for pk, col, val in cells],
+            )
+            self._mark(snapshot, at)
+
+    def current_state(self) -> pd.DataFrame:
+        """目前（valid_to 為 NULL）的值還原成寬表。"""
+        cur = pd.read_sql_query("SELECT pk, column, value FROM intervals WHERE valid_to IS NULL", self.conn)
+        if cur.empty:
+            return pd.DataFrame(columns=["pk"])
+        return cur.pivot(index="pk", columns="column", values="value").fillna("").reset_index()
+
+    # ---------------------
+    # 查詢
+    # ---------------------
+    def field_history(self, pk: str, column: str = None) -> pd.DataFrame:
+        sql = "SELECT pk, column, value, valid_from, valid_to FROM intervals WHERE pk = ?"
+        params = [pk]
+        if column:
+            sql += " AND column = ?"
+            params.append(column)
+        return pd.read_sql_query(sql + " ORDER BY column, valid_from", self.conn, params=params)
+
+    def price_drops(self, days: float = 30, now: str = None, column: str = "price") -> pd.DataFrame:
+        """
+        目前值比 days 天前的值低的 item（預設以最後一次更新時間為「現在」）。
+        """
+        now = now or self.as_of
+        if not now:
+            return pd.DataFrame(columns=["pk", "old", "new", "drop", "drop_pct"])
+        t0 = (dt.datetime.fromisoformat(now) - dt.timedelta(days=days)).strftime("%Y-%m-%dT%H:%M:%S")
+        df = pd.read_sql_query("""
+            SELECT cur.pk AS pk, CAST(old.value AS REAL) AS old, CAST(cur.value AS REAL) AS new
+            FROM intervals cur
+            JOIN intervals old ON old.pk = cur.pk AND old.column = cur.column
+            WHERE cur.column = :col AND cur.valid_to IS NULL
+              AND old.valid_from <= :t0 AND (old.valid_to IS NULL OR old.valid_to > :t0)
+              AND cur.value != '' AND old.value != ''
+              AND CAST(cur.value AS REAL) < CAST(old.value AS REAL)
+        """, self.conn, params={"col": column, "t0": t0})
+        df["drop"] = df["old"] - df["new"]
+        df["drop_pct"] = (df["drop"] / df["old"].where(df["old"] != 0)).round(4)
+        return df.sort_values("drop_pct", ascending=False).reset_index(drop=True)
+
+def _with_pk(df: pd.DataFrame) -> pd.DataFrame:
+    if "pk" not in df.columns:
+        df = df.assign(pk=df["source"].astype(str) + "::" + df["id"].astype(str))
+    return df
+
+def update_from_diff(history_path: str, prev_path: str, curr_path: str, diff_res: dict) -> HistoryStore:
+    """
+    diff 完成後更新歷史：
+    - 歷史是空的 → 先用 prev 建立初始狀態，再套用這次 diff
+    - 歷史正對應 prev → 直接套用這次 diff
+    - 已套用過 curr → 不動
+    - 其他（中間漏跑）→ 以歷史目前狀態與 curr 重新比對後套用
+    """
+    store = HistoryStore(history_path)
+    prev_name, curr_name = snapshot_name(prev_path), snapshot_name(curr_path)
+    at = snapshot_time(curr_name)
+    if store.snapshot == curr_name:
+        return store
+    if store.snapshot is None:
+        store.bootstrap(load_csv(prev_path), prev_name, snapshot_time(prev_name))
+    if store.snapshot != prev_name:
+        diff_res = diff_frames(store.current_state(), load_csv(curr_path))
+    store.apply_diff(diff_res, curr_name, at)
+    return store
@@ -0,0 +1,228 @@
+import base64, json, sqlite3, time, pathlib, threading
+
+# 工作狀態
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+class SQLiteJobQueue:
+    """
+    單機用的工作佇列（SQLite 檔案，多個 process 可共用）。
+
+    - put / claim / complete / fail：基本的工作生命週期；
+      claim 之後超過 lease_seconds 沒完成的工作會被其他 worker 重新領取，
+      重新領取也算一次嘗試，用完 max_attempts 就標記失敗（會讓 worker 當掉的工作不會無限重試）。
+    - results：依 put 順序取回某個 run 已完成工作的結果（bytes）。
+    - throttle：跨 process 共用的每個 host 最小請求間隔。
+
+    每個執行緒各用一條連線（sqlite3 連線不能跨執行緒），throttle 可以放在 asyncio.to_thread 裡呼叫。
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 600):
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._local = threading.local()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                run_id TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                claimed_at REAL,
+                result BLOB,
+                error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS jobs_run ON jobs(run_id);
+            CREATE INDEX IF NOT EXISTS jobs_state ON jobs(state);
+            CREATE TABLE IF NOT EXISTS hosts (host TEXT PRIMARY KEY, next_at REAL NOT NULL);
+        """)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        return conn
+
+    def put(self, run_id: str, payload: dict) -> int:
+        cur = self.conn.execute(
+            "INSERT INTO jobs(run_id, payload, state) VALUES (?, ?, ?)",
+            (run_id, json.dumps(payload, ensure_ascii=False), QUEUED),
+        )
+        return cur.lastrowid
+
+    def claim(self, worker: str = "", max_attempts: int = 3):
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.execute(
+                "UPDATE jobs SET state = ?, error = ? WHERE state = ? AND claimed_at < ? AND attempts >= ?",
+                (FAILED, "lease expired (worker lost)", RUNNING, now - self.lease_seconds, max_attempts),
+            )
+            row = self.conn.execute(
+                "SELECT id, run_id, payload, attempts FROM jobs "
+                "WHERE state = ? OR (state = ? AND claimed_at < ?) ORDER BY id LIMIT 1",
+                (QUEUED, RUNNING, now - self.lease_seconds),
+            ).fetchone()
+            if row is None:
+                self.conn.execute("COMMIT")
+                return None
+            self.conn.execute(
+                "UPDATE jobs SET state = ?, attempts = attempts + 1, worker = ?, claimed_at = ? WHERE id = ?",
+                (RUNNING, worker, now, row[0]),
+            )
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        return {"id": row[0], "run_id": row[1], "payload": json.loads(row[2]), "attempts": row[3] + 1}
+
+    def complete(self, job_id: int, result: bytes = b""):
+        self.conn.execute("UPDATE jobs SET state = ?, result = ?, error = NULL WHERE id = ?",
+                          (DONE, result, job_id))
+
+    def fail(self, job_id: int, error: str, max_attempts: int = 3):
+        # 還有機會就放回佇列，否則標記失敗
+        self.conn.execute(
+            "UPDATE jobs SET state = CASE WHEN attempts < ? THEN ? ELSE ? END, error = ? WHERE id = ?",
+            (max_attempts, QUEUED, FAILED, error, job_id),
+        )
+
+    def run_status(self, run_id: str) -> dict:
+        rows = self.conn.execute("SELECT state, COUNT(*) FROM jobs WHERE run_id = ? GROUP BY state", (run_id,))
+        return {state: n for state, n in rows}
+
+    def results(self, run_id: str) -> list:
+        rows = self.conn.execute("SELECT result FROM jobs WHERE run_id = ? AND state = ? ORDER BY id",
+                                 (run_id, DONE))
+        return [bytes(r[0] or b"") for r in rows]
+
+    def throttle(self, host: str, min_interval: float):
+        """預約該 host 的下一個請求時段，必要時 sleep 到時段開始。"""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute("SELECT next_at FROM hosts WHERE host = ?", (host,)).fetchone()
+            now = time.time()
+            start = max(now, row[0] if row else now)
+            self.conn.execute("INSERT OR REPLACE INTO hosts(host, next_at) VALUES (?, ?)",
+                              (host, start + min_interval))
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        if start > now:
+            time.sleep(start - now)
+
+class RedisJobQueue:
+    """
+    多台機器共用的工作佇列，只用到 Redis 的基本指令
+    (incr / hset / hget / hgetall / hincrby / rpush / lpop / lrange / zadd / zrangebyscore / zrem /
+    set nx px / pttl)，client 需以 decode_responses=True 建立；測試時可換成同介面的本地替身。
+    執行中的工作記在 sorted set（score 為 claim 時間），lease 過期的工作在 claim 時回收，規則同 SQLiteJobQueue。
+    """
+
+    def __init__(self, client, prefix: str = "webscraper", lease_seconds: float = 600):
+        self.r = client
+        self.p = prefix
+        self.lease_seconds = lease_seconds
+
+    def _job(self, job_id) -> str:
+        return f"{self.p}:job:{job_id}"
+
+    def put(self, run_id: str, payload: dict) -> int:
+        job_id = int(self.r.incr(f"{self.p}:seq"))
+        self.r.hset(self._job(job_id), mapping={
+            "run_id": run_id,
+            "payload": json.dumps(payload, ensure_ascii=False),
+            "state": QUEUED,
+            "attempts": 0,
+        })
+        self.r.rpush(f"{self.p}:run:{run_id}", job_id)
+        self.r.rpush(f"{self.p}:queue", job_id)
+        return job_id
+
+    def _reclaim(self, max_attempts: int):
+        # zrem 成功的人才處理，多個 worker 同時回收也只會放回佇列一次
+        running = f"{self.p}:running"
+        for job_id in self.r.zrangebyscore(running, 0, time.time() - self.lease_seconds):
+            if not self.r.zrem(running, job_id):
+                continue
+            key = self._job(job_id)
+            if self.r.hget(key, "state") != RUNNING:
+                continue
+            if int(self.r.hget(key, "attempts") or 0) < max_attempts:
+                self.r.hset(key, mapping={"state": QUEUED})
+                self.r.rpush(f"{self.p}:queue", job_id)
+            else:
+                self.r.hset(key, mapping={"state": FAILED, "error": "lease expired (worker lost)"})
+
+    def claim(self, worker: str = "", max_attempts: int = 3):
+        self._reclaim(max_attempts)
+        while True:
+            job_id = self.r.lpop(f"{self.p}:queue")
+            if job_id is None:
+                return None
+            key = self._job(job_id)
+            # 已被原 worker 做完（lease 過期後才回報）的工作不再執行
+            if self.r.hget(key, "state") == QUEUED:
+                break
+        attempts = int(self.r.hincrby(key, "attempts", 1))
+        now = time.time()
+        self.r.hset(key, mapping={"state": RUNNING, "worker": worker, "claimed_at": now})
+        self.r.zadd(f"{self.p}:running", {job_id: now})
+        job = self.r.hgetall(key)
+        return {"id": int(job_id), "run_id": job["run_id"], "payload": json.loads(job["payload"]),
+                "attempts": attempts}
+
+    def complete(self, job_id: int, result: bytes = b""):
+        self.r.zrem(f"{self.p}:running", job_id)
+        self.r.hset(self._job(job_id), mapping={
+            "state": DONE,
+            "result": base64.b64encode(result).decode("ascii"),
+        })
+
+    def fail(self, job_id: int, error: str, max_attempts: int = 3):
+        self.r.zrem(f"{self.p}:running", job_id)
+        key = self._job(job_id)
+        if int(self.r.hget(key, "attempts") or 0) < max_attempts:
+            self.r.hset(key, mapping={"state": QUEUED, "error": error})
+            self.r.rpush(f"{self.p}:queue", job_id)
+        else:
+            self.r.hset(key, mapping={"state": FAILED, "error": error})
+
+    def run_status(self, run_id: str) -> dict:
+        status = {}
+        for job_id in self.r.lrange(f"{self.p}:run:{run_id}", 0, -1):
+            state = self.r.hget(self._job(job_id), "state")
+            status[state] = status.get(state, 0) + 1
+        return status
+
+    def results(self, run_id: str) -> list:
+        out = []
+        for job_id in self.r.lrange(f"{self.p}:run:{run_id}", 0, -1):
+            job = self.r.hgetall(self._job(job_id))
+            if job.get("state") == DONE:
+                out.append(base64.b64decode(job.get("result", "")))
+        return out
+
+    def throttle(self, host: str, min_interval: float):
+        # 以 SET NX PX 當作 host 鎖，搶到的人才能發請求；沒搶到就等鎖過期
+        key = f"{self.p}:host:{host}"
+        ms = max(1, int(min_interval * 1000))
+        while not self.r.set(key, "1", nx=True, px=ms):
+            ttl = self.r.pttl(key)
+            time.sleep(max(ttl, 1) / 1000 if ttl and ttl > 0 else 0.01)
+
+def open_queue(url: str):
+    """
+    sqlite:///data/queue.db（或直接給檔案路徑）→ SQLiteJobQueue
+    redis://host:6379/0 → RedisJobQueue（需另外安裝 redis 套件）
+    """
+    if url.startswith("redis://") or url.startswith("rediss://"):
+        import redis
+        return RedisJobQueue(redis.Redis.from_url(url, decode_responses=True))
+    if url.startswith("sqlite:///"):
+        url = url[len("sqlite:///"):]
+    return SQLiteJobQueue(url)
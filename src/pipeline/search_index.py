@@ -0,0 +1,206 @@
+import math, os, pathlib, sqlite3
+from collections import Counter
+
+import pandas as pd
+
+from src.pipeline.storage import list_snapshots, load_snapshot, snapshot_file, snapshot_name
+from src.pipeline.diff import load_csv
+from src.pipeline.text import search_terms
+
+INDEX_PATH = "data/index/search.db"
+INDEX_FIELDS = ["title", "author", "category", "url"]
+
+# BM25 參數
+K1 = 1.2
+B = 0.75
+
+class SearchIndex:
+    """
+    持久化的 BM25 全文檢索索引（SQLite）。
+
+    - docs：每個 pk 一筆（顯示用欄位 + 文件長度）
+    - postings：term → pk → tf
+    - meta：n_docs / total_len（算 avgdl）、snapshot / version（目前索引對應的快照名稱與其檔案版本）
+
+    update() 只重建 diff 回報的新增 / 修改列並移除刪除列，不必整份重建。
+    """
+
+    def __init__(self, path: str = INDEX_PATH):
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                pk TEXT PRIMARY KEY, len INTEGER NOT NULL,
+                source TEXT, title TEXT, url TEXT, author TEXT, category TEXT
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL, pk TEXT NOT NULL, tf INTEGER NOT NULL,
+                PRIMARY KEY (term, pk)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_pk ON postings(pk);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+
+    # ---------------------
+    # meta
+    # ---------------------
+    def _meta(self, key: str, default=None):
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def _set_meta(self, key: str, value):
+        self.conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)", (key, str(value)))
+
+    @property
+    def snapshot(self):
+        return self._meta("snapshot")
+
+    @property
+    def version(self):
+        return self._meta("version")
+
+    def __len__(self):
+        return int(self._meta("n_docs", 0))
+
+    # ---------------------
+    # 寫入
+    # ---------------------
+    def _remove(self, pks):
+        removed_docs = removed_len = 0
+        for pk in pks:
+            row = self.conn.execute("SELECT len FROM docs WHERE pk = ?", (pk,)).fetchone()
+            if row is None:
+                continue
+            self.conn.execute("DELETE FROM postings WHERE pk = ?", (pk,))
+            self.conn.execute("DELETE FROM docs WHERE pk = ?", (pk,))
+            removed_docs += 1
+            removed_len += row[0]
+        return removed_docs, removed_len
+
+    def _add(self, df: pd.DataFrame):
+        added_docs = added_len = 0
+        for row in df.to_dict("records"):
+            terms = Counter()
+            for f in INDEX_FIELDS:
+                terms.update(search_terms(row.get(f, "")))
+            length = sum(terms.values())
+            self.conn.execute(
+                "INSERT OR REPLACE INTO docs(pk, len, source, title, url, author, category) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (row["pk"], length, row.get("source", ""), row.get("title", ""), row.get("url", ""),
+                 row.get("author", ""), row.get("category", "")),
+            )
+            self.conn.executemany("INSERT OR REPLACE INTO postings(term, pk, tf) VALUES (?, ?, ?)",
+                                  [(t, row["pk"], n) for t, n in terms.items()])
+            added_docs += 1
+            added_len += length
+        return added_docs, added_len
+
+    def rebuild(self, df: pd.DataFrame, snapshot: str = None, version: str = None):
+        """整份重建（第一次或索引與快照對不上時）。"""
+        df = _prepare(df)
+        with self.conn:
+            self.conn.execute("DELETE FROM postings")
+            self.conn.execute("DELETE FROM docs")
+            n, total = self._add(df)
+            self._set_meta("n_docs", n)
+            self._set_meta("total_len", total)
+            self._set_meta("snapshot", snapshot or "")
+            self._set_meta("version", version or "")
+
+    def update(self, df: pd.DataFrame, changed_pks, deleted_pks, snapshot: str = None, version: str = None):
+        """
+        增量更新：df 為新快照（可只含要重建的列），
+        changed_pks = 新增 + 修改的 pk，deleted_pks = 刪除的 pk。
+        """
+        df = _prepare(df)
+        changed = set(changed_pks)
+        with self.conn:
+            n, total = len(self), int(self._meta("total_len", 0))
+            rn, rl = self._remove(changed | set(deleted_pks))
+            an, al = self._add(df[df["pk"].isin(changed)])
+            self._set_meta("n_docs", n - rn + an)
+            self._set_meta("total_len", total - rl + al)
+            self._set_meta("snapshot", snapshot or "")
+            self._set_meta("version", version or "")
+
+    # ---------------------
+    # 查詢
+    # ---------------------
+    def search(self, query: str, top: int = 10) -> pd.DataFrame:
+        cols = ["pk", "score", "source", "title", "author", "category", "url"]
+        n = len(self)
+        terms = set(search_terms(query))
+        if not n or not terms:
+            return pd.DataFrame(columns=cols)
+        avgdl = int(self._meta("total_len", 0)) / n or 1.0
+
+        scores = Counter()
+        for term in terms:
+            rows = self.conn.execute(
+                "SELECT p.pk, p.tf, d.len FROM postings p JOIN docs d ON d.pk = p.pk WHERE p.term = ?",
+                (term,),
+            ).fetchall()
+            if not rows:
+                continue
+            idf = math.log(1 + (n - len(rows) + 0.5) / (len(rows) + 0.5))
+            for pk, tf, dl in rows:
+                scores[pk] += idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * dl / avgdl))
+
+        best = scores.most_common(top)
+        if not best:
+            return pd.DataFrame(columns=cols)
+        out = []
+        for pk, score in best:
+            row = self.conn.execute(
+                "SELECT source, title, author, category, url FROM docs WHERE pk = ?", (pk,)
+            ).fetchone()
+            out.append((pk, round(score, 4), *row))
+        return pd.DataFrame(out, columns=cols)
+
+def _prepare(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.fillna("").astype(str)
+    if "pk" not in df.columns:
+        df["pk"] = df["source"] + "::" + df["id"]
+    return df.drop_duplicates(subset=["pk"])
+
+def file_version(path: str) -> str:
+    """快照檔案的版本：檔名 + mtime。同一份快照重新 clean（或改讀 clean 結果）時版本就不同。"""
+    return f"{pathlib.Path(path).name}@{os.stat(path).st_mtime_ns}"
+
+def update_from_diff(index_path: str, prev_path: str, curr_path: str, diff_res: dict) -> SearchIndex:
+    """
+    diff 完成後更新索引：索引若正對應 prev 快照（名稱與檔案版本都相同），只重建 new / changed 列；
+    已對應 curr 就不動；否則（第一次、中間漏跑或快照內容之後又變了）用 curr 整份重建。
+    """
+    idx = SearchIndex(index_path)
+    state = (idx.snapshot, idx.version)
+    curr_state = (snapshot_name(curr_path), file_version(curr_path))
+    if state == curr_state:
+        return idx
+    curr = load_csv(curr_path)
+    if state == (snapshot_name(prev_path), file_version(prev_path)):
+        changed = list(diff_res["new"]["pk"]) + [c["pk"] for c in diff_res["changed"]]
+        deleted = list(diff_res["deleted"]["pk"])
+        idx.update(curr, changed, deleted, snapshot=curr_state[0], version=curr_state[1])
+    else:
+        idx.rebuild(curr, snapshot=curr_state[0], version=curr_state[1])
+    return idx
+
+def build_index(index_path: str, snap_dir: str) -> SearchIndex:
+    """明確要求時（cli search --rebuild）以最新快照整份重建。"""
+    idx = SearchIndex(index_path)
+    names = list_snapshots(snap_dir)
+    if names:
+        path = snapshot_file(snap_dir, names[-1])
+        idx.rebuild(load_snapshot(snap_dir, names[-1]), snapshot=names[-1], version=file_version(path))
+    return idx
+
+def open_index(index_path: str = INDEX_PATH):
+    """
+    查詢端（cli search、Streamlit 頁面）用：只開啟既有索引，不做任何重建，
+    建立 / 更新只在 diff（或 search --rebuild）時進行。還沒建立過回傳 None。
+    """
+    if not pathlib.Path(index_path).exists():
+        return None
+    idx = SearchIndex(index_path)
+    return idx if idx.snapshot else None
@@ -1,20 +1,339 @@
-import pandas as pd, datetime as dt, pathlib
+import pandas as pd, datetime as dt, pathlib, json, gzip, os, re, csv, shutil
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+from src.common.locks import locked
+
+MANIFEST = "manifest.json"
+CLEAN_SUFFIX = ".clean"
 
 def today_stamp():
     # 保留原本的日戳：YYYYMMDD
     return dt.datetime.now().strftime("%Y%m%d")
 
-def write_snapshot(df: pd.DataFrame, out_dir: str) -> str:
+def write_snapshot(df: pd.DataFrame, out_dir: str, shards: int = None, shard_by: str = "pk") -> str:
+    """
+    寫一份新快照。shards > 1（或 shard_by="source"）時寫成分片目錄 snapshot_<ts>/，
+    讀取與 diff 可以各分片平行處理；否則維持單一 CSV。
+    """
     out = pathlib.Path(out_dir)
     out.mkdir(parents=True, exist_ok=True)
     # 新增時間到秒，避免同一天覆蓋：YYYYMMDD_HHMMSS
     ts = dt.datetime.now().strftime("%Y%m%d_%H%M%S")
-    path = out / f"snapshot_{ts}.csv"
-    df.to_csv(path, index=False)
+    sharded = (shard_by == "source" or (shards or 1) > 1) and not df.empty
+    if sharded:
+        path = out / f"snapshot_{ts}"
+        files = write_shards(df, path, shards=shards, shard_by=shard_by)
+        entry = {"name": path.name, "kind": "sharded", "file": path.name, "shard_by": shard_by, "shards": len(files)}
+    else:
+        path = out / f"snapshot_{ts}.csv"
+        df.to_csv(path, index=False)
+        entry = {"name": path.stem, "kind": "full", "file": path.name}
+    # 登記到 manifest，之後找最新快照不用掃目錄（鎖內重新讀取再寫回，不會蓋掉其他 process 的登記）
+    with manifest_lock(out):
+        manifest = _load_manifest(out)
+        manifest["snapshots"] = [e for e in manifest["snapshots"] if e["name"] != entry["name"]]
+        manifest["snapshots"].append(entry)
+        _save_manifest(out, manifest)
+    return str(path)
+
+def write_csv_atomic(df: pd.DataFrame, path: str) -> str:
+    """先寫同目錄的暫存檔再 os.replace，中途失敗不會留下寫一半的快照。"""
+    path = pathlib.Path(path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        df.to_csv(tmp, index=False)
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return str(path)
+
+# ---------------------
+# 分片快照：snapshot_<ts>/ 底下每個分片一個 CSV
+#   pk-00003-of-00008.csv  依 pk 雜湊分 N 片（同一個 pk 每次都落在同一片）
+#   source-<name>.csv      依來源分片
+# 檔名本身就描述了分片方式，兩份快照分片方式相同時可以逐片 diff。
+# ---------------------
+# 與 pandas read_csv 預設相同的空值字串，分片讀出來的內容才會和 load_csv 一致
+_NA_VALUES = ["", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+              "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"]
+_PK_SHARD_RE = re.compile(r"pk-(\d+)-of-(\d+)\.csv$")
+
+def shard_ids(keys: pd.Series, n: int) -> pd.Series:
+    """主鍵 → 分片編號（固定 hash key，跨 run 穩定）。"""
+    return pd.Series(pd.util.hash_pandas_object(keys.astype(str), index=False).to_numpy() % n, index=keys.index)
+
+def _shard_name(value: str) -> str:
+    return "source-" + re.sub(r"[^\w.-]", "_", str(value)) + ".csv"
+
+def write_shards(df: pd.DataFrame, path, shards: int = None, shard_by: str = "pk") -> list:
+    """df 依 pk 雜湊（或 source）寫成分片目錄，各分片平行、原子寫入；回傳分片檔名。"""
+    d = pathlib.Path(path)
+    d.mkdir(parents=True, exist_ok=True)
+    if shard_by == "source":
+        groups = [(_shard_name(k), g) for k, g in df.groupby(df["source"].astype(str), sort=True)]
+    else:
+        n = int(shards or os.cpu_count() or 1)
+        ids = shard_ids(_keys(df), n)
+        groups = [(f"pk-{i:05d}-of-{n:05d}.csv", df[ids == i]) for i in range(n)]
+    with ThreadPoolExecutor() as ex:
+        list(ex.map(lambda g: write_csv_atomic(g[1], d / g[0]), groups))
+    names = {name for name, _ in groups}
+    for f in d.glob("*.csv"):
+        if f.name not in names:      # 重寫時分片組成改變（例如少了一個來源）
+            f.unlink()
+    return sorted(names)
+
+def shard_files(path) -> list:
+    return sorted(pathlib.Path(path).glob("*.csv"))
+
+def shard_scheme(path):
+    """("pk", N) / ("source", None)；混合或無法辨識回傳 None。"""
+    names = [f.name for f in shard_files(path)]
+    if names and all(n.startswith("source-") for n in names):
+        return ("source", None)
+    counts = {m.group(2) for m in map(_PK_SHARD_RE.match, names) if m}
+    if names and len(counts) == 1 and all(_PK_SHARD_RE.match(n) for n in names):
+        return ("pk", int(counts.pop()))
+    return None
+
+def read_csv_fast(path, keep_na_strings: bool = False) -> pd.DataFrame:
+    """
+    pyarrow 讀 CSV（多執行緒、釋放 GIL），所有欄位為字串，空值為 ""（同 load_csv）。
+    keep_na_strings=True 時 "NA" / "null" 等字串保留原樣（同 keep_default_na=False）。
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        header = next(csv.reader(f), [])
+    if not header:
+        return pd.DataFrame()
+    table = pa_csv.read_csv(
+        path,
+        parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+        convert_options=pa_csv.ConvertOptions(column_types={c: pa.string() for c in header},
+                                              null_values=[""] if keep_na_strings else _NA_VALUES,
+                                              strings_can_be_null=True),
+    )
+    return table.to_pandas().fillna("")
+
+def read_shards(path, workers: int = None, keep_na_strings: bool = False) -> pd.DataFrame:
+    """以 thread pool 平行讀取分片目錄內所有分片並合併。"""
+    files = shard_files(path)
+    if not files:
+        return pd.DataFrame()
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        frames = list(ex.map(lambda f: read_csv_fast(f, keep_na_strings), files))
+    return pd.concat(frames, ignore_index=True)
+
+def write_clean(df: pd.DataFrame, snap_dir: str, name: str) -> str:
+    """
+    clean 的結果寫在原始快照旁（snapshot_<ts>.clean.csv，分片快照為同樣分片方式的 snapshot_<ts>.clean/），
+    原始快照不動；登記在 manifest 的 clean 欄位後，diff / 檢索 / 頁面讀這份快照都會讀清理後的內容。
+    """
+    d = pathlib.Path(snap_dir)
+    raw = pathlib.Path(snapshot_file(snap_dir, name, raw=True))
+    if raw.is_dir():
+        path = d / f"{name}{CLEAN_SUFFIX}"
+        scheme = shard_scheme(raw)
+        if scheme and scheme[0] == "source":
+            write_shards(df, path, shard_by="source")
+        else:
+            write_shards(df, path, shards=scheme[1] if scheme else None)
+    else:
+        path = pathlib.Path(write_csv_atomic(df, d / f"{name}{CLEAN_SUFFIX}.csv"))
+    with manifest_lock(d):
+        manifest = _load_manifest(d)
+        for e in manifest["snapshots"]:
+            if e["name"] == name:
+                e["clean"] = path.name
+        _save_manifest(d, manifest)
     return str(path)
 
 def latest_two_snapshots(snap_dir: str):
-    p = pathlib.Path(snap_dir)
-    files = sorted(p.glob("snapshot_*.csv"))
-    if len(files) < 2: return None, None
-    return str(files[-2]), str(files[-1])
+    entries = _load_manifest(pathlib.Path(snap_dir))["snapshots"]
+    if len(entries) < 2: return None, None
+    return snapshot_path(snap_dir, entries[-2]), snapshot_path(snap_dir, entries[-1])
+
+def latest_snapshot(snap_dir: str, raw: bool = False):
+    entries = _load_manifest(pathlib.Path(snap_dir))["snapshots"]
+    return snapshot_path(snap_dir, entries[-1], raw=raw) if entries else None
+
+def list_snapshots(snap_dir: str) -> list:
+    """manifest 中的快照名稱（舊 → 新），包含已壓成 delta 的。"""
+    return [e["name"] for e in _load_manifest(pathlib.Path(snap_dir))["snapshots"]]
+
+def snapshot_path(snap_dir: str, entry: dict, raw: bool = False) -> str:
+    """快照的檔案：已 clean 過的讀清理結果，raw=True 則一律回傳原始快照。"""
+    return str(pathlib.Path(snap_dir) / (entry["file"] if raw else entry.get("clean", entry["file"])))
+
+def snapshot_name(path: str) -> str:
+    """快照路徑 → 名稱：snapshot_<ts>[.clean][.csv] → snapshot_<ts>。"""
+    name = pathlib.Path(path).name
+    for suffix in (".csv", CLEAN_SUFFIX):
+        name = name.removesuffix(suffix)
+    return name
+
+def snapshot_file(snap_dir: str, name: str, raw: bool = False) -> str:
+    """快照實際存放的檔案（full CSV、分片目錄、clean 結果或 delta）。"""
+    for e in _load_manifest(pathlib.Path(snap_dir))["snapshots"]:
+        if e["name"] == name:
+            return snapshot_path(snap_dir, e, raw=raw)
+    raise FileNotFoundError(f"Snapshot not in manifest: {name}")
+
+# ---------------------
+# Manifest
+# ---------------------
+def _load_manifest(snap_dir: pathlib.Path) -> dict:
+    path = snap_dir / MANIFEST
+    if path.exists():
+        return json.loads(path.read_text(encoding="utf-8"))
+    # 沒有 manifest（舊資料夾）→ 只掃一次目錄建立
+    files = sorted(f for f in snap_dir.glob("snapshot_*.csv") if not f.stem.endswith(CLEAN_SUFFIX))
+    return {"snapshots": [{"name": f.stem, "kind": "full", "file": f.name} for f in files]}
+
+@contextmanager
+def manifest_lock(snap_dir: pathlib.Path):
+    """manifest 讀取 → 修改 → 寫回 整段持有的跨 process 檔案鎖（scrape / coordinator / compact 同時執行時）。"""
+    snap_dir = pathlib.Path(snap_dir)
+    snap_dir.mkdir(parents=True, exist_ok=True)
+    with open(snap_dir / (MANIFEST + ".lock"), "a+") as f, locked(f):
+        yield
+
+def _save_manifest(snap_dir: pathlib.Path, manifest: dict):
+    snap_dir.mkdir(parents=True, exist_ok=True)
+    tmp = snap_dir / (MANIFEST + ".tmp")
+    tmp.write_text(json.dumps(manifest, indent=1, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, snap_dir / MANIFEST)
+
+# ---------------------
+# Delta 儲存：週期性 full base + 兩次快照間的壓縮差異
+# ---------------------
+def _read_full(path) -> pd.DataFrame:
+    if pathlib.Path(path).is_dir():
+        return read_shards(path, keep_na_strings=True)
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+def _remove_file(path: pathlib.Path):
+    if path.is_dir():
+        shutil.rmtree(path)
+    elif path.exists():
+        os.remove(path)
+
+def _remove_entry_files(d: pathlib.Path, entry: dict):
+    # 原始快照與 clean 結果一起刪
+    for name in (entry["file"], entry.pop("clean", None)):
+        if name:
+            _remove_file(d / name)
+
+def _keys(df: pd.DataFrame) -> pd.Series:
+    if "pk" in df.columns:
+        return df["pk"].astype(str)
+    return df["source"].astype(str) + "::" + df["id"].astype(str)
+
+def _make_delta(prev: pd.DataFrame, curr: pd.DataFrame) -> dict:
+    """
+    curr 相對於 prev 的差異：新增列整列保存、共同列只存有變動的欄位、
+    刪除列由 order（curr 的主鍵順序）隱含。
+    """
+    prev_idx = prev.set_index(_keys(prev))
+    curr_idx = curr.set_index(_keys(curr))
+    upsert = {}
+    common = curr_idx.index.intersection(prev_idx.index)
+    for k in curr_idx.index.difference(prev_idx.index):
+        upsert[k] = curr_idx.loc[k].to_dict()
+    for col in curr.columns:
+        a = prev_idx[col].reindex(common) if col in prev_idx.columns else pd.Series(None, index=common)
+        b = curr_idx[col].reindex(common)
+        for k in common[(a != b).to_numpy()]:
+            upsert.setdefault(k, {})[col] = b.loc[k]
+    return {"columns": list(curr.columns), "order": list(curr_idx.index), "upsert": upsert}
+
+def _apply_delta(prev: pd.DataFrame, delta: dict) -> pd.DataFrame:
+    prev_idx = prev.set_index(_keys(prev))
+    out = prev_idx.reindex(index=delta["order"], columns=delta["columns"]).fillna("")
+    for k, cells in delta["upsert"].items():
+        for col, val in cells.items():
+            out.at[k, col] = val
+    return out.reset_index(drop=True)
+
+def _has_unique_keys(df: pd.DataFrame) -> bool:
+    return ("pk" in df.columns or {"source", "id"}.issubset(df.columns)) and _keys(df).is_unique
+
+def load_snapshot(snap_dir: str, name: str = None) -> pd.DataFrame:
+    """
+    讀取任一快照（name 省略 = 最新）。delta 會從最近的 full base 依序套用還原。
+    """
+    d = pathlib.Path(snap_dir)
+    entries = _load_manifest(d)["snapshots"]
+    if not entries:
+        raise FileNotFoundError(f"No snapshots in {snap_dir}")
+    names = [e["name"] for e in entries]
+    i = names.index(name) if name else len(entries) - 1
+    # 往回找最近的 full base（單一 CSV 或分片目錄）
+    j = i
+    while entries[j]["kind"] == "delta":
+        j -= 1
+    df = _read_full(snapshot_path(d, entries[j]))
+    for e in entries[j + 1:i + 1]:
+        with gzip.open(d / e["file"], "rt", encoding="utf-8") as f:
+            df = _apply_delta(df, json.load(f))
+    return df
+
+def compact_snapshots(snap_dir: str, full_every: int = 8, keep: int = None, keep_full: int = 2) -> dict:
+    """
+    壓縮與保留策略：
+    - 最新 keep_full 份維持完整 CSV（diff / clean 直接讀檔）
+    - 轉成 delta 的快照以 clean 結果（有的話）為內容，原始快照與 clean 檔一併刪除
+    - 更舊的快照每 full_every 份留一份 full base，其餘改存成相對前一份的 gzip delta
+    - keep：只保留最新 keep 份，更舊的刪除（最舊一份保留的若是 delta 會先還原成 full）
+    回傳 {"deltas": 新增 delta 數, "removed": 刪除的快照數}
+    """
+    with manifest_lock(snap_dir):
+        return _compact_locked(pathlib.Path(snap_dir), full_every, keep, keep_full)
+
+def _compact_locked(d: pathlib.Path, full_every: int, keep, keep_full: int) -> dict:
+    snap_dir = str(d)
+    manifest = _load_manifest(d)
+    entries = manifest["snapshots"]
+    stats = {"deltas": 0, "removed": 0}
+
+    # 保留策略
+    if keep and len(entries) > keep:
+        cut = len(entries) - keep
+        first = entries[cut]
+        if first["kind"] == "delta":
+            df = load_snapshot(snap_dir, first["name"])
+            os.remove(d / first["file"])
+            first.update(kind="full", file=f"{first['name']}.csv")
+            df.to_csv(d / first["file"], index=False)
+        for e in entries[:cut]:
+            _remove_entry_files(d, e)
+        entries = entries[cut:]
+        stats["removed"] = cut
+
+    # 轉 delta（依序處理，prev 為上一份還原後的內容）
+    prev, since_base = None, 0
+    for e in entries[:max(0, len(entries) - keep_full)]:
+        if e["kind"] != "delta":
+            curr = _read_full(snapshot_path(d, e))
+            if prev is not None and since_base < full_every - 1 and _has_unique_keys(prev) and _has_unique_keys(curr):
+                path = d / f"{e['name']}.delta.json.gz"
+                with gzip.open(path, "wt", encoding="utf-8") as f:
+                    json.dump(_make_delta(prev, curr), f, ensure_ascii=False)
+                _remove_entry_files(d, e)
+                e.update(kind="delta", file=path.name)
+                e.pop("shard_by", None); e.pop("shards", None)
+                stats["deltas"] += 1
+                since_base += 1
+            else:
+                since_base = 0
+        else:
+            with gzip.open(d / e["file"], "rt", encoding="utf-8") as f:
+                curr = _apply_delta(prev, json.load(f))
+            since_base += 1
+        prev = curr
+
+    manifest["snapshots"] = entries
+    _save_manifest(d, manifest)
+    return stats
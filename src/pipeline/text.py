@@ -0,0 +1,24 @@
+import re
+
+# 英數字連續字串為一個 token；中日韓文字每個字一個 token
+_CJK = r"\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff"
+_TOKEN_RE = re.compile(r"[0-9a-z]+|[" + _CJK + "]")
+_CJK_RUN_RE = re.compile("[" + _CJK + "]{2,}")
+
+def tokenize(text) -> list:
+    if text is None:
+        return []
+    return _TOKEN_RE.findall(str(text).lower())
+
+def search_terms(text) -> list:
+    """
+    檢索用的詞：英數字詞 + 中日韓單字 + 連續中日韓字的 bigram
+    （「資訊檢索」→ 資, 訊, 檢, 索, 資訊, 訊檢, 檢索），不需要斷詞字典。
+    """
+    if text is None:
+        return []
+    text = str(text).lower()
+    terms = _TOKEN_RE.findall(text)
+    for run in _CJK_RUN_RE.findall(text):
+        terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
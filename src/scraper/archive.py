@@ -0,0 +1,134 @@
+# src/scraper/archive.py
+
+import datetime as dt
+import gzip
+import hashlib
+import json
+import os
+import pathlib
+import shutil
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from .static_scraper import extract_rows
+from .rows import batches_to_frame
+from .json_scraper import extract_json_rows
+
+ARCHIVE_DIR = "data/archive"
+# 預設只保留最新幾個 run，封存不會無限成長
+ARCHIVE_KEEP = 5
+
+def new_run_id() -> str:
+    # 與快照檔名相同的時間戳格式：YYYYMMDD_HHMMSS
+    return dt.datetime.now().strftime("%Y%m%d_%H%M%S")
+
+class ResponseArchive:
+    """
+    以內容雜湊定址的回應封存（每次 scrape 一個 run 目錄）：
+
+        <root>/<run_id>/index.jsonl           每抓一頁寫一行 (source, page, url, status, sha256)
+        <root>/<run_id>/bodies/<sha256>.gz    gzip 壓縮的回應內容，相同內容只存一份
+    """
+
+    def __init__(self, root: str = ARCHIVE_DIR, run_id: str = None):
+        self.run_id = run_id or new_run_id()
+        self.dir = pathlib.Path(root) / self.run_id
+        (self.dir / "bodies").mkdir(parents=True, exist_ok=True)
+        self.index_path = self.dir / "index.jsonl"
+        self._lock = threading.Lock()
+
+    def record(self, source: str, page: int, url: str, body, status: int = 200) -> str:
+        data = body.encode("utf-8") if isinstance(body, str) else body
+        digest = hashlib.sha256(data).hexdigest()
+
+        path = self.dir / "bodies" / f"{digest}.gz"
+        if not path.exists():
+            # 先寫暫存檔再 rename，避免中斷時留下半個檔案
+            tmp = path.with_suffix(f".{os.getpid()}.tmp")
+            with gzip.open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+
+        entry = {
+            "source": source,
+            "page": int(page),
+            "url": url,
+            "status": int(status),
+            "sha256": digest,
+            "fetched_at": dt.datetime.now(dt.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        }
+        with self._lock, open(self.index_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return digest
+
+def prune_runs(root: str = ARCHIVE_DIR, keep: int = ARCHIVE_KEEP) -> list:
+    """
+    保留最新 keep 個 run（run_id 為時間戳，依名稱排序即新舊），更舊的整個目錄刪除；keep 為 0 / None 時不刪。
+    還沒寫入任何一頁的 run（可能正在進行）不計入也不刪。回傳刪除的 run_id。
+    """
+    root = pathlib.Path(root)
+    if not keep or not root.is_dir():
+        return []
+    runs = sorted(p for p in root.iterdir() if (p / "index.jsonl").exists())
+    old = runs[:-keep]
+    for p in old:
+        shutil.rmtree(p, ignore_errors=True)
+    return [p.name for p in old]
+
+def resolve_run(run: str, root: str = ARCHIVE_DIR) -> pathlib.Path:
+    """run 可以是 run_id（在 root 底下找）或直接是 run 目錄路徑。"""
+    p = pathlib.Path(run)
+    if not (p / "index.jsonl").exists():
+        p = pathlib.Path(root) / run
+    if not (p / "index.jsonl").exists():
+        raise FileNotFoundError(f"Archived run not found: {run}")
+    return p
+
+def read_index(run_dir) -> list:
+    with open(pathlib.Path(run_dir) / "index.jsonl", "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def read_body(run_dir, digest: str) -> str:
+    with gzip.open(pathlib.Path(run_dir) / "bodies" / f"{digest}.gz", "rb") as f:
+        return f.read().decode("utf-8")
+
+def _replay_page(job):
+    # 在子行程執行：讀取封存內容並解析，完全不碰網路
+    run_dir, entry, source_cfg = job
+    html = read_body(run_dir, entry["sha256"])
+    if source_cfg.get("mode") == "json":
+        rows = extract_json_rows(html, source_cfg, entry["url"])
+        if rows is not None:
+            return rows
+    return extract_rows(html, source_cfg, entry["url"])
+
+def replay_run(run: str, sources: list, root: str = ARCHIVE_DIR, workers: int = None) -> pd.DataFrame:
+    """
+    以目前設定檔的 selectors 重新擷取封存的回應，零網路 I/O。
+    各頁在 process pool 中平行解析，結果依原抓取順序合併。
+    """
+    run_dir = resolve_run(run, root)
+    by_name = {s["name"]: s for s in sources}
+
+    jobs = []
+    for entry in read_index(run_dir):
+        cfg = by_name.get(entry["source"])
+        if cfg is None:
+            print(f"Skip archived source not in config: {entry['source']}", file=sys.stderr)
+            continue
+        jobs.append((str(run_dir), entry, cfg))
+
+    if not jobs:
+        return pd.DataFrame()
+
+    workers = workers or os.cpu_count() or 1
+    if workers <= 1:
+        pages = [_replay_page(j) for j in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            pages = list(ex.map(_replay_page, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+    return batches_to_frame(pages)
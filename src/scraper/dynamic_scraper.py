@@ -1,114 +1,163 @@
 # src/scraper/dynamic_scraper.py
 
+import sys
+import asyncio
 import pandas as pd
 from playwright.sync_api import sync_playwright, Page, TimeoutError as PlaywrightTimeoutError
-from .utils import allowed_by_robots, polite_delay
-from urllib.parse import urljoin
-import time
+from .utils import allowed_by_robots, polite_delay, polite_delay_async
+from .retry import RETRY_STATUSES, MAX_RETRIES, RetryPolicy, DEFAULT_POLICY
+from .rows import RowBatch
+from .error_handler import log_retry
+from .json_scraper import scrape_json, JsonSourceUnavailable
+from .static_scraper import extract_rows
 
-RETRY_STATUSES = {429, 500, 502, 503, 504}
-MAX_RETRIES = 4
-BASE_DELAY = 1.0
-
-def exponential_backoff(attempt: int, base_delay: float = BASE_DELAY) -> float:
-    """指數退避: 1s, 2s, 4s, 8s..."""
-    return base_delay * (2 ** (attempt - 1))
-
-def navigate_with_retry(page: Page, url: str, max_retries: int = MAX_RETRIES):
+def navigate_with_retry(page: Page, url: str, max_retries: int = MAX_RETRIES, policy: RetryPolicy = None):
     """
     Playwright 頁面導航 + 重試機制
-    處理 429/5xx 錯誤和超時
+    處理 429/5xx 錯誤和超時（退避 / Retry-After / 斷路器由共用的 RetryPolicy 處理）
     """
-    last_exc = None
-    
-    for attempt in range(1, max_retries + 1):
-        try:
-            resp = page.goto(url, wait_until="domcontentloaded", timeout=30000)
-            sc = resp.status if resp else 200
-            
-            # 檢查狀態碼
-            if sc in RETRY_STATUSES:
-                if attempt < max_retries:
-                    # 檢查 Retry-After header
-                    ra = resp.headers.get("retry-after") if resp else None
-                    wait = float(ra) if ra else exponential_backoff(attempt)
-                    
-                    print(f"HTTP {sc} on {url}")
-                    print(f"   Retry {attempt}/{max_retries} after {wait:.1f}s...")
-                    time.sleep(wait)
-                    continue
-                else:
-                    raise RuntimeError(f"HTTP {sc} after {max_retries} retries")
-            
-            return resp
-            
-        except PlaywrightTimeoutError as e:
-            last_exc = e
-            if attempt < max_retries:
-                wait = exponential_backoff(attempt)
-                print(f"Timeout on {url}")
-                print(f"   Retry {attempt}/{max_retries} after {wait:.1f}s...")
-                time.sleep(wait)
-            else:
-                raise
+    resp = (policy or DEFAULT_POLICY).call(
+        url,
+        lambda: page.goto(url, wait_until="domcontentloaded", timeout=30000),
+        status_of=lambda r: r.status if r else 200,
+        retry_after_of=lambda r: r.headers.get("retry-after") if r else None,
+        retry_exceptions=(PlaywrightTimeoutError,),
+        max_retries=max_retries,
+        on_retry=log_retry,
+    )
     
-    if last_exc:
-        raise last_exc
-
-def extract_attr(el, attr):
-    try:
-        return el.get_attribute(attr) or ""
-    except Exception:
-        return ""
+    sc = resp.status if resp else 200
+    if sc in RETRY_STATUSES:
+        raise RuntimeError(f"HTTP {sc} after {max_retries} retries")
+    return resp
 
 def _do_infinite_scroll(page, times=6, wait_ms=500):
     for _ in range(times):
         page.evaluate("window.scrollTo(0, document.body.scrollHeight);")
         page.wait_for_timeout(wait_ms)
 
-def _scrape_items_from_page(page, source_cfg, base_url):
-    elements = page.query_selector_all(source_cfg["item_selector"])
-    rows = []
+async def _goto_async(page, url: str, max_retries: int = MAX_RETRIES, policy: RetryPolicy = None):
+    """navigate_with_retry 的 async 版（平行分頁用）。"""
+    from playwright.async_api import TimeoutError as AsyncTimeoutError
+    resp = await (policy or DEFAULT_POLICY).acall(
+        url,
+        lambda: page.goto(url, wait_until="domcontentloaded", timeout=30000),
+        status_of=lambda r: r.status if r else 200,
+        retry_after_of=lambda r: r.headers.get("retry-after") if r else None,
+        retry_exceptions=(AsyncTimeoutError,),
+        max_retries=max_retries,
+        on_retry=log_retry,
+    )
+    sc = resp.status if resp else 200
+    if sc in RETRY_STATUSES:
+        raise RuntimeError(f"HTTP {sc} after {max_retries} retries")
+    return resp
+
+async def _fetch_pages_async(source_cfg: dict, page_nos: list, concurrency: int,
+                             archive=None, throttle=None) -> dict:
+    """
+    同一個 browser context 開 concurrency 個分頁，各自從佇列領頁碼、
+    依 pagination.url_template 直接導航並擷取；回傳 {頁碼: RowBatch}（失敗的頁為 None）。
+    某頁沒有資料就視為最後一頁，之後的頁碼不再抓。
+    """
+    from playwright.async_api import async_playwright, TimeoutError as AsyncTimeoutError
+
+    tmpl = source_cfg["pagination"]["url_template"]
+    scroll_cfg = source_cfg.get("infinite_scroll") or {}
+    todo = asyncio.Queue()
+    for n in page_nos:
+        todo.put_nowait(n)
+    results = {}
+    last = [max(page_nos)]
 
-    for el in elements:
-        row = {}
-        for field, selector in source_cfg["fields"].items():
-            if not selector:
-                row[field] = ""
+    async def worker(context):
+        tab = await context.new_page()
+        while not todo.empty():
+            n = todo.get_nowait()
+            if n > last[0]:
                 continue
-                
-            if "@ " in selector or " @" in selector:
-                css, attr = selector.split("@")
-                node = el.query_selector(css.strip()) or page.query_selector(css.strip())
-                row[field] = extract_attr(node, attr.strip()) if node else ""
-            else:
-                node = el.query_selector(selector) or page.query_selector(selector)
-                row[field] = node.inner_text().strip() if node else ""
-            
-            if field == "url" and row[field]:
-                row[field] = urljoin(base_url, row[field])
-        
-        row["source"] = source_cfg["name"]
-        if not row.get("id"):
-            row["id"] = row.get("url") or row.get("title")
-        
-        rows.append(row)
-    
-    return rows
+            url = tmpl.format(page=n)
+            try:
+                # throttle 可能 sleep（共用的 host 限速），放到 thread 裡等，其他分頁照常進行
+                if throttle is not None:
+                    await asyncio.to_thread(throttle, url)
+                await _goto_async(tab, url)
+                try:
+                    await tab.wait_for_selector(source_cfg["item_selector"], timeout=5000)
+                except AsyncTimeoutError:
+                    pass
+                for _ in range(int(scroll_cfg.get("times", 0)) if scroll_cfg else 0):
+                    await tab.evaluate("window.scrollTo(0, document.body.scrollHeight);")
+                    await tab.wait_for_timeout(int(scroll_cfg.get("wait_ms", 500)))
+                html = await tab.content()
+            except Exception as e:
+                if n == page_nos[0]:
+                    raise
+                print(f"  page {n} failed, skipped: {e}", file=sys.stderr)
+                results[n] = None
+                continue
+            if archive is not None:
+                archive.record(source_cfg["name"], n, tab.url, html)
+            rows = extract_rows(html, source_cfg, tab.url)
+            results[n] = rows
+            if not len(rows):
+                last[0] = min(last[0], n)
+            await polite_delay_async()
+        await tab.close()
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        context = await browser.new_context()
+        try:
+            await asyncio.gather(*(worker(context) for _ in range(min(concurrency, len(page_nos)))))
+        finally:
+            await browser.close()
+    return results
+
+def _scrape_url_template(source_cfg: dict, archive=None, throttle=None) -> RowBatch:
+    """頁面可用網址直接定位時（pagination.url_template），多個分頁平行抓取，結果依頁序合併。"""
+    pag = source_cfg["pagination"]
+    start = int(pag.get("start_page", 1))
+    page_nos = list(range(start, start + int(pag.get("max_pages", 1))))
+    results = asyncio.run(_fetch_pages_async(source_cfg, page_nos, int(pag.get("concurrency", 4)),
+                                             archive=archive, throttle=throttle))
+    all_rows = RowBatch.for_source(source_cfg)
+    for n in page_nos:
+        rows = results.get(n)
+        if rows is None:
+            continue
+        if not len(rows):
+            break
+        all_rows.extend(rows)
+    return all_rows
 
-def scrape_dynamic(source_cfg: dict) -> pd.DataFrame:
+def scrape_dynamic(source_cfg: dict, archive=None, throttle=None) -> pd.DataFrame:
     url = source_cfg["list_url"]
     
+    # mode: json → 先試 JSON 快速路徑（內嵌 JSON / XHR API），不行再開瀏覽器逐頁爬
+    if source_cfg.get("mode") == "json":
+        try:
+            return scrape_json(source_cfg, archive=archive, throttle=throttle)
+        except JsonSourceUnavailable as e:
+            print(f"JSON fast path unavailable for {source_cfg['name']}: {e}; falling back to browser",
+                  file=sys.stderr)
+    
     if not allowed_by_robots(url):
         raise RuntimeError(f"Blocked by robots.txt: {url}")
     
-    all_rows = []
+    # 頁面可由網址定位 → 多分頁平行抓取；否則照原本點 next 逐頁
+    if (source_cfg.get("pagination") or {}).get("url_template"):
+        return _scrape_url_template(source_cfg, archive=archive, throttle=throttle).to_frame()
+    
+    all_rows = RowBatch.for_source(source_cfg)
     
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=True)
         page = browser.new_page()
         
         # 使用重試機制導航
+        if throttle is not None:
+            throttle(url)
         navigate_with_retry(page, url)
         
         # 無限捲動 (optional)
@@ -122,28 +171,39 @@ def scrape_dynamic(source_cfg: dict) -> pd.DataFrame:
         
         polite_delay()
         
+        # 封存渲染後的 DOM，之後可用 scrape --replay 離線重新擷取；
+        # 擷取與 replay 共用 extract_rows，並以同一個網址（page.url）解析相對連結，結果才會一致
+        html = page.content()
+        if archive is not None:
+            archive.record(source_cfg["name"], 1, page.url, html)
+        
         # 當前頁
-        all_rows.extend(_scrape_items_from_page(page, source_cfg, url))
+        all_rows.extend(extract_rows(html, source_cfg, page.url))
         
         # 翻頁處理
         pag = source_cfg.get("pagination") or {}
         next_sel = pag.get("next_selector")
         max_pages = int(pag.get("max_pages", 1))
         
-        for _ in range(max_pages - 1):
+        for page_no in range(2, max_pages + 1):
             if not next_sel:
                 break
             
             try:
                 page.wait_for_selector(next_sel, timeout=3000)
+                if throttle is not None:
+                    throttle(url)
                 page.click(next_sel)
                 page.wait_for_load_state("networkidle")
             except PlaywrightTimeoutError:
                 break
             
             polite_delay()
-            all_rows.extend(_scrape_items_from_page(page, source_cfg, url))
+            html = page.content()
+            if archive is not None:
+                archive.record(source_cfg["name"], page_no, page.url, html)
+            all_rows.extend(extract_rows(html, source_cfg, page.url))
         
         browser.close()
     
-    return pd.DataFrame(all_rows)
+    return all_rows.to_frame()
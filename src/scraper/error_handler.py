@@ -1,54 +1,204 @@
 # src/scraper/error_handler.py
 import os
+import sys
 import csv
+import io
+import shutil
 import time
+import queue
+import atexit
+import threading
+import contextlib
+import contextvars
 from datetime import datetime
 from typing import Callable
 
-from scraper.http_client import exponential_backoff, RobotsGuard
+from src.common.locks import locked
+from .retry import DEFAULT_POLICY, RetryPolicy
+from .utils import crawl_delay
 
 
 LOG_PATH = "data/logs/error_log.csv"
+LOG_COLUMNS = ["time", "source", "url", "status", "attempt", "latency_ms", "error"]
 
-def log_error(url: str, error: str, attempt: int):
-    os.makedirs(os.path.dirname(LOG_PATH), exist_ok=True)
-    with open(LOG_PATH, "a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow([
-            datetime.now().isoformat(timespec="seconds"),
-            url,
-            attempt,
-            error
-        ])
+# 目前正在爬的來源名稱（由 error_source() 設定），讓 log 不必層層傳 source
+_current_source = contextvars.ContextVar("error_source", default="")
+
+@contextlib.contextmanager
+def error_source(name: str):
+    token = _current_source.set(name or "")
+    try:
+        yield
+    finally:
+        _current_source.reset(token)
+
+def _legacy_path(path: str) -> str:
+    # error_log.csv → error_log.legacy.csv（已存在就加編號，不覆蓋先前輪替出來的檔案）
+    stem, ext = os.path.splitext(path)
+    candidate, n = f"{stem}.legacy{ext}", 1
+    while os.path.exists(candidate):
+        candidate, n = f"{stem}.legacy.{n}{ext}", n + 1
+    return candidate
+
+class ErrorLogSink:
+    """
+    非同步、批次寫入的錯誤紀錄：
+
+    - put() 只把紀錄放進 queue，爬蟲執行緒不碰檔案
+    - 背景 thread 每累積 batch_size 筆或每 flush_interval 秒寫一次
+    - 每批在檔案鎖內一次 append，多執行緒 / 多 process 共用同一份 CSV 也不會寫壞
+    - queue 滿了（錯誤風暴）就丟棄並計數，不拖慢爬蟲
+    """
+
+    def __init__(self, path: str = LOG_PATH, batch_size: int = 200,
+                 flush_interval: float = 1.0, max_queue: int = 10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._thread = None
+
+    def _ensure_started(self):
+        # fork 之後子 process 沒有背景 thread，依 pid 判斷要不要重建
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_queue)
+            self._thread = threading.Thread(target=self._run, name="error-log-sink", daemon=True)
+            self._thread.start()
+            self._pid = os.getpid()
+            atexit.register(self.close)
+
+    def put(self, record: dict):
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+    def _run(self):
+        q = self._queue
+        batch, stop = [], False
+        while not stop:
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    item = q.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    q.task_done()
+                    break
+                batch.append(item)
+            if batch:
+                try:
+                    self._write(batch)
+                except OSError as e:
+                    print(f"  error log write failed ({len(batch)} records): {e}")
+                for _ in batch:
+                    q.task_done()
+                batch = []
+
+    def _write(self, batch: list):
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for r in batch:
+            writer.writerow([r.get(c, "") for c in LOG_COLUMNS])
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        header = ",".join(LOG_COLUMNS)
+        with open(self.path, "a+", newline="", encoding="utf-8") as f, locked(f):
+            f.seek(0)
+            first = f.readline()
+            if first and first.rstrip("\r\n") != header:
+                # 舊版格式（4 欄、沒有表頭）：先複製保留再清空，新格式從空檔開始，整份仍是一個 CSV
+                legacy = _legacy_path(self.path)
+                shutil.copyfile(self.path, legacy)
+                f.truncate(0)
+                print(f"  error log: moved old-format log to {legacy}", file=sys.stderr)
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                f.write(header + "\r\n")
+            f.write(buf.getvalue())
+
+    def flush(self):
+        """等 queue 內的紀錄全部寫入檔案。"""
+        if self._pid == os.getpid():
+            self._queue.join()
+        self._report_dropped()
+
+    def close(self):
+        if self._pid != os.getpid() or not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        self._report_dropped()
+
+    def _report_dropped(self):
+        # queue 滿時丟掉的筆數：印警告並在 log 補一列，避免遺失的紀錄無聲無息
+        with self._lock:
+            n, self.dropped = self.dropped, 0
+        if not n:
+            return
+        print(f"  error log: dropped {n} records (queue full)", file=sys.stderr)
+        try:
+            self._write([{
+                "time": datetime.now().isoformat(timespec="seconds"),
+                "source": "error_log",
+                "error": f"dropped {n} records (queue full)",
+            }])
+        except OSError as e:
+            print(f"  error log write failed: {e}", file=sys.stderr)
+
+# 整個 process 共用一份
+DEFAULT_SINK = ErrorLogSink()
+
+def log_error(url: str, error: str, attempt: int, status: int = None,
+              latency: float = None, source: str = None):
+    DEFAULT_SINK.put({
+        "time": datetime.now().isoformat(timespec="seconds"),
+        "source": source if source is not None else _current_source.get(),
+        "url": url,
+        "status": status if status is not None else "",
+        "attempt": attempt,
+        "latency_ms": round(latency * 1000) if latency is not None else "",
+        "error": error,
+    })
+
+def log_retry(url: str, attempt: int, error: str, status=None, latency=None, wait=None):
+    """給 RetryPolicy.call(on_retry=...) 用：每次失敗記一筆。"""
+    log_error(url, error, attempt, status=status, latency=latency)
 
 def safe_delay_from_robots(url: str, fallback: float = 1.0):
     """
     根據 robots.txt 中的 crawl-delay 決定延遲，若沒有則使用 fallback。
     """
-    guard = RobotsGuard()
-    cd = guard.crawl_delay(url)
+    cd = crawl_delay(url)
     if cd:
         time.sleep(cd)
     else:
         time.sleep(fallback)
 
-def retry_with_backoff_for_playwright(max_retries: int = 4):
+def retry_with_backoff_for_playwright(max_retries: int = 4, policy: RetryPolicy = None):
     """
     裝飾器：給 dynamic_scraper 的 page.goto() 用。
-    自動處理 429 / 5xx / TimeoutError。
+    自動處理 429 / 5xx / TimeoutError；退避、預算與斷路器沿用共用的 RetryPolicy。
     """
     def decorator(func: Callable):
         def wrapper(*args, **kwargs):
-            last_exc = None
-            for attempt in range(1, max_retries + 1):
-                try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    last_exc = e
-                    url = kwargs.get("url") or "N/A"
-                    log_error(url, str(e), attempt)
-                    delay = exponential_backoff(attempt)
-                    time.sleep(delay)
-            raise last_exc
+            url = kwargs.get("url") or "N/A"
+            return (policy or DEFAULT_POLICY).call(
+                url,
+                lambda: func(*args, **kwargs),
+                retry_exceptions=(Exception,),
+                max_retries=max_retries,
+                on_retry=log_retry,
+            )
         return wrapper
     return decorator
@@ -1,16 +1,14 @@
 # src/scraper/http_client.py
 
 import requests
-import time
 from typing import Optional
 
-RETRY_STATUSES = {429, 500, 502, 503, 504}
-MAX_RETRIES = 4
-BASE_DELAY = 1.0  # 基礎延遲時間(秒)
+from .retry import RETRY_STATUSES, MAX_RETRIES, BASE_DELAY, RetryPolicy, DEFAULT_POLICY
+from .error_handler import log_retry
 
 def exponential_backoff(attempt: int, base_delay: float = BASE_DELAY) -> float:
     """
-    計算指數退避延遲時間
+    計算指數退避延遲時間（不含 jitter；實際重試使用 RetryPolicy 的 decorrelated jitter）
     
     Args:
         attempt: 當前重試次數 (1-based)
@@ -26,78 +24,47 @@ def get_with_retry(
     url: str, 
     session: Optional[requests.Session] = None,
     user_agent: Optional[str] = None,
-    max_retries: int = MAX_RETRIES
+    max_retries: int = MAX_RETRIES,
+    policy: Optional[RetryPolicy] = None
 ) -> requests.Response:
     """
     帶重試機制的 HTTP GET 請求
     
     - 遇到 429 或 5xx 錯誤會自動重試
-    - 使用指數退避策略
-    - 尊重 Retry-After header
+    - 退避與 Retry-After / 斷路器處理交給共用的 RetryPolicy (retry.py)
     
     Args:
         url: 目標 URL
         session: requests.Session 物件 (optional)
         user_agent: User-Agent header (optional)
         max_retries: 最大重試次數
+        policy: RetryPolicy (optional，預設為整個 process 共用的 DEFAULT_POLICY)
     
     Returns:
         requests.Response 物件
         
     Raises:
         requests.RequestException: 超過最大重試次數後拋出
+        CircuitOpenError: 該 host 的斷路器開啟中
     """
     sess = session or requests.Session()
     
     if user_agent:
         sess.headers.update({"User-Agent": user_agent})
     
-    last_exception = None
+    response = (policy or DEFAULT_POLICY).call(
+        url,
+        lambda: sess.get(url, timeout=30),
+        status_of=lambda r: r.status_code,
+        retry_after_of=lambda r: r.headers.get("Retry-After"),
+        retry_exceptions=(requests.RequestException,),
+        max_retries=max_retries,
+        on_retry=log_retry,
+    )
     
-    for attempt in range(1, max_retries + 1):
-        try:
-            response = sess.get(url, timeout=30)
-            
-            # 如果狀態碼正常,直接回傳
-            if response.status_code not in RETRY_STATUSES:
-                return response
-            
-            # 處理需要重試的狀態碼
-            if attempt < max_retries:
-                # 優先檢查 Retry-After header
-                retry_after = response.headers.get("Retry-After")
-                
-                if retry_after:
-                    # Retry-After 可能是秒數或日期,這裡簡化處理為秒數
-                    try:
-                        wait_time = float(retry_after)
-                    except ValueError:
-                        wait_time = exponential_backoff(attempt)
-                else:
-                    wait_time = exponential_backoff(attempt)
-                
-                print(f"  HTTP {response.status_code} on {url}")
-                print(f"   Retry {attempt}/{max_retries} after {wait_time:.1f}s...")
-                time.sleep(wait_time)
-                continue
-            else:
-                # 最後一次嘗試仍失敗
-                response.raise_for_status()
-                
-        except requests.RequestException as e:
-            last_exception = e
-            
-            if attempt < max_retries:
-                wait_time = exponential_backoff(attempt)
-                print(f"  Request failed: {e}")
-                print(f"   Retry {attempt}/{max_retries} after {wait_time:.1f}s...")
-                time.sleep(wait_time)
-            else:
-                print(f" Max retries exceeded for {url}")
-                raise
-    
-    # 如果所有重試都失敗
-    if last_exception:
-        raise last_exception
+    # 重試用盡仍是 429/5xx
+    if response.status_code in RETRY_STATUSES:
+        print(f" Max retries exceeded for {url}")
+        response.raise_for_status()
     
     return response
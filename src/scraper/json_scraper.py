@@ -0,0 +1,284 @@
+# src/scraper/json_scraper.py
+
+import json
+import re
+from urllib.parse import urljoin, urlparse, parse_qs, urlencode, urlunparse
+
+import pandas as pd
+import requests
+from bs4 import BeautifulSoup
+
+from .utils import allowed_by_robots
+from .rows import RowBatch
+from .retry import RETRY_STATUSES, DEFAULT_POLICY, RetryPolicy
+from .error_handler import log_retry
+from .static_scraper import _fetch_page, _next_page_url
+
+class JsonSourceUnavailable(RuntimeError):
+    """找不到可用的 JSON 資料（或中途失敗），呼叫端應改用瀏覽器爬取。"""
+
+_PATH_TOKEN_RE = re.compile(r"\.?([^.\[\]]+)|\[(\*|-?\d+)\]")
+_ASSIGN_RE = re.compile(r"=\s*(?=[\[{])")
+
+def json_path(data, path: str):
+    """
+    簡化版 JSONPath：$.a.b[0].c、items[*].name、$[*]。
+    路徑中有 [*] 時回傳 list，否則回傳單一值；找不到回傳 None。
+    """
+    path = (path or "").strip()
+    if path.startswith("$"):
+        path = path[1:]
+    values, many = [data], False
+    for key, idx in _PATH_TOKEN_RE.findall(path):
+        nxt = []
+        for v in values:
+            if key:
+                if isinstance(v, dict) and key in v:
+                    nxt.append(v[key])
+            elif idx == "*":
+                many = True
+                if isinstance(v, list):
+                    nxt.extend(v)
+                elif isinstance(v, dict):
+                    nxt.extend(v.values())
+            elif isinstance(v, list) and -len(v) <= int(idx) < len(v):
+                nxt.append(v[int(idx)])
+        values = nxt
+    if many:
+        return values
+    return values[0] if values else None
+
+def _is_items(v) -> bool:
+    return isinstance(v, list) and bool(v) and all(isinstance(x, dict) for x in v)
+
+def find_items(data, items_path: str = None):
+    """依 items 路徑取出資料列；沒設定時自動找：最外層 list 或第一層中最長的 list of dict。"""
+    if items_path:
+        v = json_path(data, items_path)
+        return v if _is_items(v) else None
+    if _is_items(data):
+        return data
+    if isinstance(data, dict):
+        lists = [v for v in data.values() if _is_items(v)]
+        if lists:
+            return max(lists, key=len)
+    return None
+
+def inline_json(html: str) -> list:
+    """
+    頁面 <script> 內嵌的 JSON：application/json、ld+json 整段解析，
+    一般 script 則找 `= [ ... ]` / `= { ... }` 形式的指定式（例如 var data = [...]）。
+    """
+    soup = BeautifulSoup(html, "lxml")
+    decoder = json.JSONDecoder()
+    found = []
+    for s in soup.find_all("script"):
+        text = s.string or s.get_text() or ""
+        if not text.strip():
+            continue
+        if "json" in (s.get("type") or ""):
+            try:
+                found.append(json.loads(text))
+            except ValueError:
+                pass
+            continue
+        for m in _ASSIGN_RE.finditer(text):
+            try:
+                found.append(decoder.raw_decode(text, m.end())[0])
+            except ValueError:
+                pass
+    return found
+
+def _candidates(body: str) -> list:
+    try:
+        return [json.loads(body)]
+    except ValueError:
+        return inline_json(body)
+
+def _cell(v) -> str:
+    if v is None:
+        return ""
+    if isinstance(v, list):
+        return ", ".join(_cell(x) for x in v if x is not None)
+    if isinstance(v, dict):
+        return json.dumps(v, ensure_ascii=False)
+    return str(v).strip()
+
+def rows_from_json(data, source_cfg: dict, page_url: str) -> RowBatch:
+    """把一份 JSON 依 json.items / json.fields 對應成資料列；沒有資料回傳 None。"""
+    jcfg = source_cfg.get("json") or {}
+    items = find_items(data, jcfg.get("items"))
+    if items is None:
+        return None
+    mapping = jcfg.get("fields") or {}
+    rows = RowBatch.for_source(source_cfg)
+    for item in items:
+        row = {}
+        for field in source_cfg["fields"]:
+            # 沒有對應的欄位：與欄位同名的 key（若有），否則留空
+            path = mapping.get(field, field)
+            row[field] = _cell(json_path(item, path)) if path else ""
+            if field == "url" and row[field]:
+                row[field] = urljoin(page_url, row[field])
+        if not row.get("id"):
+            row["id"] = row.get("url") or row.get("title") or ""
+        rows.append(row)
+    return rows
+
+def extract_json_rows(body: str, source_cfg: dict, page_url: str) -> RowBatch:
+    """從回應內容（JSON 本體或含內嵌 JSON 的 HTML）擷取資料列；找不到回傳 None。"""
+    for data in _candidates(body):
+        rows = rows_from_json(data, source_cfg, page_url)
+        if rows is not None:
+            return rows
+    return None
+
+class _PendingArchive:
+    """先暫存要封存的回應，JSON 路徑整個成功才寫進真正的 archive（失敗改走瀏覽器時不會重複）。"""
+
+    def __init__(self):
+        self.entries = []
+
+    def record(self, *args, **kwargs):
+        self.entries.append((args, kwargs))
+
+    def commit(self, archive):
+        for args, kwargs in self.entries:
+            archive.record(*args, **kwargs)
+
+def _capture_xhr(source_cfg: dict, throttle=None, policy: RetryPolicy = None):
+    """
+    用 Playwright 開一次列表頁，收集 JSON 類型的 XHR / fetch 回應，
+    回傳第一個能對應出資料列的 (url, body)。導航與其他抓取共用 RetryPolicy 的重試。
+    """
+    from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+
+    url = source_cfg["list_url"]
+    captured = []
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        page = browser.new_page()
+        page.on("response", lambda r: captured.append(r)
+                if r.request.resource_type in ("xhr", "fetch") else None)
+        if throttle is not None:
+            throttle(url)
+        resp = (policy or DEFAULT_POLICY).call(
+            url,
+            lambda: page.goto(url, wait_until="networkidle", timeout=30000),
+            status_of=lambda r: r.status if r else 200,
+            retry_after_of=lambda r: r.headers.get("retry-after") if r else None,
+            retry_exceptions=(PlaywrightTimeoutError,),
+            on_retry=log_retry,
+        )
+        if resp is not None and resp.status in RETRY_STATUSES:
+            browser.close()
+            raise RuntimeError(f"HTTP {resp.status} after retries: {url}")
+        found = None
+        for r in captured:
+            try:
+                body = r.text()
+            except Exception:
+                continue
+            if extract_json_rows(body, source_cfg, r.url) is not None:
+                found = (r.url, body)
+                break
+        browser.close()
+    return found
+
+def _next_xhr_url(url: str, data, jcfg: dict):
+    # 1) json.next：回應中的下一頁網址  2) json.page_param：網址中的頁碼 +1（json.has_next 為 false 時停）
+    if jcfg.get("next"):
+        nxt = json_path(data, jcfg["next"])
+        return urljoin(url, nxt) if isinstance(nxt, str) and nxt else None
+    if jcfg.get("has_next") and not json_path(data, jcfg["has_next"]):
+        return None
+    param = jcfg.get("page_param", "page")
+    parts = urlparse(url)
+    qs = parse_qs(parts.query)
+    if param not in qs:
+        return None
+    try:
+        qs[param] = [str(int(qs[param][0]) + 1)]
+    except ValueError:
+        return None
+    return urlunparse(parts._replace(query=urlencode(qs, doseq=True)))
+
+def _scrape_inline(body: str, rows: RowBatch, source_cfg: dict, session, archive, throttle,
+                   max_pages: int, next_sel: str) -> RowBatch:
+    # 內嵌 JSON：照 HTML 的 next_selector 翻頁，每頁都以一般 HTTP 抓
+    all_rows, page_url = rows, source_cfg["list_url"]
+    for page_no in range(2, max_pages + 1):
+        page_url = _next_page_url(BeautifulSoup(body, "lxml"), next_sel, page_url)
+        if not page_url:
+            break
+        body = _fetch_page(page_url, source_cfg, session, archive=archive, page_no=page_no, throttle=throttle)
+        rows = extract_json_rows(body, source_cfg, page_url)
+        if rows is None:
+            raise JsonSourceUnavailable(f"No inline JSON on {page_url}")
+        all_rows.extend(rows)
+    return all_rows
+
+def _scrape_xhr(api_url: str, body: str, source_cfg: dict, session, archive, throttle,
+                max_pages: int) -> RowBatch:
+    # XHR API：第一頁用瀏覽器攔截到的內容，之後直接以 HTTP 抓 API
+    jcfg = source_cfg.get("json") or {}
+    all_rows = RowBatch.for_source(source_cfg)
+    if archive is not None:
+        archive.record(source_cfg["name"], 1, api_url, body)
+    for page_no in range(1, max_pages + 1):
+        if page_no > 1:
+            body = _fetch_page(api_url, source_cfg, session, archive=archive, page_no=page_no, throttle=throttle)
+        data = json.loads(body)
+        rows = rows_from_json(data, source_cfg, api_url)
+        if rows is None:
+            break
+        all_rows.extend(rows)
+        api_url = _next_xhr_url(api_url, data, jcfg)
+        if not api_url:
+            break
+    return all_rows
+
+def scrape_json(source_cfg: dict, archive=None, throttle=None, policy: RetryPolicy = None) -> pd.DataFrame:
+    """
+    dynamic 來源的 JSON 快速路徑（mode: json）：
+
+    1. 先以一般 HTTP 抓列表頁，若 <script> 內嵌 JSON 就完全不開瀏覽器，下一頁用 next_selector 找
+    2. 否則用 Playwright 開一次頁面，攔截 XHR / fetch 的 JSON 回應，
+       之後的頁面直接以 HTTP 抓該 API（json.next 或 json.page_param 翻頁）
+    3. 找不到資料或中途失敗就拋 JsonSourceUnavailable，由 scrape_dynamic 改用瀏覽器
+
+    policy：XHR 攔截時導航用的 RetryPolicy（預設為共用的 DEFAULT_POLICY）
+    """
+    url = source_cfg["list_url"]
+    if not allowed_by_robots(url):
+        raise RuntimeError(f"Blocked by robots.txt: {url}")
+
+    pag = source_cfg.get("pagination") or {}
+    max_pages = int(pag.get("max_pages", 1))
+    session = requests.Session()
+    pending = _PendingArchive() if archive is not None else None
+
+    try:
+        body = _fetch_page(url, source_cfg, session, archive=pending, page_no=1, throttle=throttle)
+        rows = extract_json_rows(body, source_cfg, url)
+        if rows is not None:
+            rows = _scrape_inline(body, rows, source_cfg, session, pending, throttle,
+                                  max_pages, pag.get("next_selector"))
+        else:
+            try:
+                found = _capture_xhr(source_cfg, throttle=throttle, policy=policy)
+            except Exception as e:
+                raise JsonSourceUnavailable(f"XHR capture failed: {e}") from e
+            if found is None:
+                raise JsonSourceUnavailable(f"No JSON data found for {url}")
+            if not allowed_by_robots(found[0]):
+                raise JsonSourceUnavailable(f"Blocked by robots.txt: {found[0]}")
+            # 列表頁本身不含資料，只封存 API 回應
+            pending = _PendingArchive() if archive is not None else None
+            rows = _scrape_xhr(found[0], found[1], source_cfg, session, pending, throttle, max_pages)
+    except (requests.RequestException, ValueError) as e:
+        raise JsonSourceUnavailable(str(e)) from e
+
+    if pending is not None:
+        pending.commit(archive)
+    return rows.to_frame()
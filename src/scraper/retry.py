@@ -0,0 +1,218 @@
+# src/scraper/retry.py
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+from urllib.parse import urlparse
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRIES = 4
+BASE_DELAY = 1.0      # 第一次重試的最短等待(秒)
+MAX_DELAY = 30.0      # 退避上限(秒)
+MAX_RETRY_AFTER = 120.0
+BUDGET_WINDOW = 60.0   # 重試預算的滑動視窗(秒)
+
+class CircuitOpenError(RuntimeError):
+    """host 的斷路器開啟中，直接失敗不發請求。"""
+
+def parse_retry_after(value, now: Optional[datetime] = None) -> Optional[float]:
+    """
+    解析 Retry-After header：秒數（"120"）或 HTTP-date（"Wed, 21 Oct 2015 07:28:00 GMT"）。
+    無法解析回傳 None；日期已過回傳 0。
+    """
+    if value is None:
+        return None
+    s = str(value).strip()
+    if not s:
+        return None
+    try:
+        return max(0.0, float(s))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(s)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    now = now or datetime.now(timezone.utc)
+    return max(0.0, (when - now).total_seconds())
+
+class CircuitBreaker:
+    """
+    每個 host 一個斷路器：連續失敗 failure_threshold 次就開啟，
+    reset_timeout 秒內對該 host 的請求直接失敗；之後放行一個試探請求（half-open），
+    成功就關閉、失敗就再開啟。
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 60.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = {}
+        self._opened_at = {}
+        self._lock = threading.Lock()
+
+    def allow(self, host: str) -> bool:
+        with self._lock:
+            opened = self._opened_at.get(host)
+            if opened is None:
+                return True
+            if time.monotonic() - opened >= self.reset_timeout:
+                # half-open：放行一次，期間先把開啟時間往後推，避免同時放行多個
+                self._opened_at[host] = time.monotonic()
+                return True
+            return False
+
+    def record_success(self, host: str):
+        with self._lock:
+            self._failures.pop(host, None)
+            self._opened_at.pop(host, None)
+
+    def record_failure(self, host: str):
+        with self._lock:
+            n = self._failures.get(host, 0) + 1
+            self._failures[host] = n
+            if n >= self.failure_threshold:
+                self._opened_at[host] = time.monotonic()
+
+    def is_open(self, host: str) -> bool:
+        with self._lock:
+            return host in self._opened_at
+
+class RetryPolicy:
+    """
+    靜態 (requests) 與動態 (Playwright) 抓取共用的重試策略：
+
+    - decorrelated jitter 退避：wait = min(max_delay, uniform(base_delay, prev_wait * 3))
+    - 優先採用 Retry-After（秒數或 HTTP-date），上限 MAX_RETRY_AFTER
+    - 每個 host 的重試預算：任意 budget_window 秒內該 host 最多重試 retry_budget 次（滑動視窗，會隨時間回補）
+    - 每個 host 的斷路器：壞掉的 host 直接 fast-fail，不再讓每一頁都跑完整個重試階梯
+    """
+
+    def __init__(self, max_retries: int = MAX_RETRIES, base_delay: float = BASE_DELAY,
+                 max_delay: float = MAX_DELAY, retry_budget: int = 20,
+                 budget_window: float = BUDGET_WINDOW,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_budget = retry_budget
+        self.budget_window = budget_window
+        self.breaker = breaker or CircuitBreaker()
+        self._spent = {}
+        self._lock = threading.Lock()
+
+    def next_delay(self, prev: float) -> float:
+        return min(self.max_delay, random.uniform(self.base_delay, max(self.base_delay, prev * 3)))
+
+    def _take_budget(self, host: str) -> bool:
+        with self._lock:
+            # 只計算視窗內的重試；長時間執行的 worker 不會因為很久以前的失敗而永遠不再重試
+            spent = self._spent.setdefault(host, deque())
+            now = time.monotonic()
+            while spent and now - spent[0] >= self.budget_window:
+                spent.popleft()
+            if len(spent) >= self.retry_budget:
+                return False
+            spent.append(now)
+            return True
+
+    def _failed(self, host: str, attempt: int, max_retries: int, result, wait: float,
+                retry_after_of: Callable):
+        """記錄一次失敗；回傳 (是否放棄, 下次等待秒數)。"""
+        self.breaker.record_failure(host)
+        give_up = (attempt >= max_retries
+                   or self.breaker.is_open(host)
+                   or not self._take_budget(host))
+        if not give_up:
+            ra = parse_retry_after(retry_after_of(result)) if result is not None else None
+            wait = min(ra, MAX_RETRY_AFTER) if ra is not None else self.next_delay(wait)
+        return give_up, wait
+
+    def _start(self, url: str, max_retries: Optional[int]):
+        host = urlparse(url).netloc or url
+        if not self.breaker.allow(host):
+            raise CircuitOpenError(f"Circuit open for {host}, skip {url}")
+        return host, max_retries or self.max_retries
+
+    def call(self, url: str, fn: Callable,
+             status_of: Callable = lambda r: None,
+             retry_after_of: Callable = lambda r: None,
+             retry_exceptions: tuple = (Exception,),
+             max_retries: Optional[int] = None,
+             on_retry: Optional[Callable] = None):
+        """
+        執行 fn()，遇到 retry_exceptions 或 status_of(結果) 屬於 RETRY_STATUSES 時重試。
+
+        重試用盡時：例外會往外拋；狀態碼錯誤則回傳最後一次的結果，由呼叫端決定怎麼處理。
+        斷路器開啟時拋出 CircuitOpenError。
+        on_retry(url, attempt, error, status, latency, wait) 在每次失敗時呼叫（可用來記錄錯誤）。
+        """
+        host, max_retries = self._start(url, max_retries)
+        wait = self.base_delay
+        for attempt in range(1, max_retries + 1):
+            t0 = time.monotonic()
+            error, result, status = None, None, None
+            try:
+                result = fn()
+            except retry_exceptions as e:
+                error = e
+            else:
+                status = status_of(result)
+                if status not in RETRY_STATUSES:
+                    self.breaker.record_success(host)
+                    return result
+            latency = time.monotonic() - t0
+            give_up, wait = self._failed(host, attempt, max_retries, result, wait, retry_after_of)
+            if self._report(url, attempt, max_retries, error, status, latency, wait, give_up, on_retry):
+                if error is not None:
+                    raise error
+                return result
+            time.sleep(wait)
+
+    async def acall(self, url: str, fn: Callable,
+                    status_of: Callable = lambda r: None,
+                    retry_after_of: Callable = lambda r: None,
+                    retry_exceptions: tuple = (Exception,),
+                    max_retries: Optional[int] = None,
+                    on_retry: Optional[Callable] = None):
+        """call() 的 async 版：fn() 回傳 awaitable，等待用 asyncio.sleep（不卡住其他分頁）。"""
+        host, max_retries = self._start(url, max_retries)
+        wait = self.base_delay
+        for attempt in range(1, max_retries + 1):
+            t0 = time.monotonic()
+            error, result, status = None, None, None
+            try:
+                result = await fn()
+            except retry_exceptions as e:
+                error = e
+            else:
+                status = status_of(result)
+                if status not in RETRY_STATUSES:
+                    self.breaker.record_success(host)
+                    return result
+            latency = time.monotonic() - t0
+            give_up, wait = self._failed(host, attempt, max_retries, result, wait, retry_after_of)
+            if self._report(url, attempt, max_retries, error, status, latency, wait, give_up, on_retry):
+                if error is not None:
+                    raise error
+                return result
+            await asyncio.sleep(wait)
+
+    def _report(self, url, attempt, max_retries, error, status, latency, wait, give_up, on_retry) -> bool:
+        if on_retry is not None:
+            on_retry(url, attempt, str(error) if error else f"HTTP {status}", status, latency,
+                     None if give_up else wait)
+        if not give_up:
+            reason = f"HTTP {status}" if error is None else f"{type(error).__name__}: {error}"
+            print(f"  {reason} on {url}")
+            print(f"   Retry {attempt}/{max_retries} after {wait:.1f}s...")
+        return give_up
+
+# 整個 process 共用一份，重試預算與斷路器狀態才會跨頁面、跨來源累積
+DEFAULT_POLICY = RetryPolicy()
@@ -0,0 +1,79 @@
+# src/scraper/rows.py
+
+import sys
+import numpy as np
+import pandas as pd
+
+class RowBatch:
+    """
+    單一來源的資料列，以欄為單位累積（取代每列一個 dict）。
+
+    欄位依 source_cfg["fields"] 決定（必要時補上 id），source 字串整批只存一份；
+    to_frame() 直接組成 DataFrame，source 為 categorical。
+    """
+
+    __slots__ = ("source", "fields", "columns", "_id_added")
+
+    def __init__(self, source: str, fields):
+        self.source = sys.intern(source)
+        self.fields = list(fields)
+        self._id_added = "id" not in self.fields
+        if self._id_added:
+            self.fields.append("id")
+        self.columns = [[] for _ in self.fields]
+
+    @classmethod
+    def for_source(cls, source_cfg: dict) -> "RowBatch":
+        return cls(source_cfg["name"], source_cfg["fields"].keys())
+
+    def append(self, values: dict):
+        for col, f in zip(self.columns, self.fields):
+            col.append(values.get(f, ""))
+
+    def extend(self, other: "RowBatch"):
+        for col, other_col in zip(self.columns, other.columns):
+            col.extend(other_col)
+
+    def __len__(self):
+        return len(self.columns[0]) if self.columns else 0
+
+    def __iter__(self):
+        # 逐列 dict 檢視（測試 / 除錯用）
+        for values in zip(*self.columns):
+            row = dict(zip(self.fields, values))
+            row["source"] = self.source
+            yield row
+
+    def to_frame(self) -> pd.DataFrame:
+        n = len(self)
+        data = {f: pd.Series(col, dtype=object) for f, col in zip(self.fields, self.columns)}
+        data["source"] = pd.Categorical.from_codes(np.zeros(n, dtype=np.int8), categories=[self.source])
+        # 欄位順序與原本 dict 版本相同：fields..., source（fields 沒有 id 時 id 排在最後）
+        if self._id_added:
+            order = self.fields[:-1] + ["source", "id"]
+        else:
+            order = self.fields + ["source"]
+        return pd.DataFrame(data, columns=order)
+
+def batches_to_frame(batches) -> pd.DataFrame:
+    """依序合併多個 RowBatch（可混合不同來源），相鄰同來源先合併再轉 DataFrame。"""
+    merged = []
+    for b in batches:
+        if merged and merged[-1].source == b.source and merged[-1].fields == b.fields \
+                and merged[-1]._id_added == b._id_added:
+            merged[-1].extend(b)
+        else:
+            nb = RowBatch(b.source, b.fields[:-1] if b._id_added else b.fields)
+            nb.extend(b)
+            merged.append(nb)
+    frames = [b.to_frame() for b in merged if len(b)]
+    if not frames:
+        return pd.DataFrame()
+    return concat_frames(frames)
+
+def concat_frames(frames) -> pd.DataFrame:
+    """pd.concat 之後把 source 維持為 categorical（不同類別的 categorical 直接 concat 會退化成 object）。"""
+    df = pd.concat(frames, ignore_index=True)
+    if "source" in df.columns:
+        df["source"] = df["source"].astype("category")
+    return df
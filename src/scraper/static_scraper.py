@@ -1,16 +1,21 @@
 # src/scraper/static_scraper.py
 
+import re
 import requests
 import pandas as pd
-from bs4 import BeautifulSoup
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from bs4 import BeautifulSoup, SoupStrainer
 from .utils import allowed_by_robots, polite_delay
 from .http_client import get_with_retry  #  確保這行正確
+from .rows import RowBatch
 from urllib.parse import urljoin
 
 def extract_text(el):
     return el.get_text(strip=True) if el else ""
 
-def get_attr(soup, selector, attr=None):
+def get_attr(soup, selector, attr=None, fallback=None):
+    # fallback：item 內找不到時改在整頁找（dynamic 來源的行為）
     if not selector:
         return ""
     
@@ -21,42 +26,134 @@ def get_attr(soup, selector, attr=None):
         css = selector
     
     node = soup.select_one(css)
+    if node is None and fallback is not None:
+        node = fallback.select_one(css)
     if not node:
         return ""
     
     return node.get(attr, "") if attr else extract_text(node)
 
-def _scrape_one_page(page_url: str, source_cfg: dict, session: requests.Session):
-    # 使用帶重試機制的 get_with_retry
-    resp = get_with_retry(page_url, session=session, user_agent="WebScraperBot/1.0")
-    resp.raise_for_status()
-    
-    polite_delay()
-    
-    soup = BeautifulSoup(resp.text, "lxml")
+def extract_rows(html: str, source_cfg: dict, page_url: str) -> RowBatch:
+    """
+    從單頁 HTML 依 source_cfg 的 item_selector / fields 擷取資料列。
+    不做任何網路存取，static / dynamic 的即時爬取與 replay 都用這一個擷取函式。
+    dynamic 來源的欄位在 item 內找不到時改在整頁找（例如頁首的分類名稱）；
+    其他來源只看 item 內，解析時以 item_selector 縮小建樹範圍（側欄、頁首等不建樹）。
+    """
+    strainer = None if source_cfg.get("type") == "dynamic" else _strain_for(source_cfg["item_selector"])
+    return _extract_from_soup(BeautifulSoup(html, "lxml", parse_only=strainer), source_cfg, page_url)
+
+def _extract_from_soup(soup, source_cfg: dict, page_url: str) -> RowBatch:
     items = soup.select(source_cfg["item_selector"])
+    page = soup if source_cfg.get("type") == "dynamic" else None
     
-    rows = []
+    rows = RowBatch.for_source(source_cfg)
     for it in items:
         row = {}
         for field, selector in source_cfg["fields"].items():
-            val = get_attr(it, selector)
+            val = get_attr(it, selector, fallback=page)
             
             if field == "url" and val:
                 val = urljoin(page_url, val)
             
             row[field] = val
         
-        row["source"] = source_cfg["name"]
-        
         if not row.get("id"):
             row["id"] = row.get("url") or row.get("title") or ""
         
         rows.append(row)
     
+    return rows
+
+def _fetch_page(page_url: str, source_cfg: dict, session: requests.Session, archive=None, page_no: int = 1,
+                throttle=None) -> str:
+    # 分散式 worker 會傳入跨機器共用的 host 限速
+    if throttle is not None:
+        throttle(page_url)
+    
+    # 使用帶重試機制的 get_with_retry
+    resp = get_with_retry(page_url, session=session, user_agent="WebScraperBot/1.0")
+    resp.raise_for_status()
+    
+    # 封存原始回應，之後可用 scrape --replay 離線重新擷取
+    if archive is not None:
+        archive.record(source_cfg["name"], page_no, page_url, resp.text, status=resp.status_code)
+    
+    polite_delay()
+    return resp.text
+
+def _scrape_one_page(page_url: str, source_cfg: dict, session: requests.Session, archive=None, page_no: int = 1,
+                     throttle=None):
+    html = _fetch_page(page_url, source_cfg, session, archive=archive, page_no=page_no, throttle=throttle)
+    soup = BeautifulSoup(html, "lxml")
+    rows = _extract_from_soup(soup, source_cfg, page_url)
     return rows, soup
 
-def scrape_static(source_cfg: dict) -> pd.DataFrame:
+def _next_page_url(soup, next_sel: str, page_url: str):
+    next_node = soup.select_one(next_sel) if next_sel else None
+    if not next_node:
+        return None
+    href = next_node.get("href", "")
+    return urljoin(page_url, href) if href else None
+
+_COMPOUND_RE = re.compile(r"\s*([a-zA-Z][\w-]*)?((?:[.#][\w-]+)*)(?=[\s>]|$)")
+
+def _strain_for(selector: str):
+    """
+    依 CSS selector 第一段（例如 "li.next a" → <li class="next">、"article.product_pod"）建 SoupStrainer：
+    只保留可能符合的元素與其子樹，selector 在縮小後的樹上結果不變。
+    selector 含兄弟組合子、屬性或 pseudo-class 等無法安全縮小的語法時回傳 None（整頁解析）。
+    """
+    sel = (selector or "").strip()
+    if not sel or re.search(r"[,+~\[\]:*]", sel):
+        return None
+    m = _COMPOUND_RE.match(sel)
+    if not m or not (m.group(1) or m.group(2)):
+        return None
+    attrs = {}
+    for kind, value in re.findall(r"([.#])([\w-]+)", m.group(2)):
+        if kind == "#":
+            attrs["id"] = value
+        else:
+            attrs.setdefault("class", value)     # 只用第一個 class 過濾，其餘交給 select 比對
+    return SoupStrainer(m.group(1) or True, attrs=attrs)
+
+def _scrape_pages_pooled(start_url: str, source_cfg: dict, session: requests.Session,
+                         max_pages: int, next_sel: str, workers: int, archive=None,
+                         throttle=None) -> RowBatch:
+    """
+    抓取與解析分離：主執行緒只負責抓頁與找下一頁連結，
+    解析 + 欄位擷取交給 ProcessPoolExecutor，避開 GIL。
+    下一頁網址要從剛抓到的頁面才找得到（且每次請求之間有 polite_delay），抓取仍是一次一頁；
+    重疊的是「抓第 n+1 頁」與「解析前面幾頁」。在途頁數上限為 workers * 2（背壓），記憶體不會隨頁數成長。
+    """
+    strainer = _strain_for(next_sel)
+    max_inflight = workers * 2
+    pending = deque()
+    all_rows = RowBatch.for_source(source_cfg)
+    page_url = start_url
+    
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for page_no in range(1, max_pages + 1):
+            html = _fetch_page(page_url, source_cfg, session, archive=archive, page_no=page_no, throttle=throttle)
+            pending.append(pool.submit(extract_rows, html, source_cfg, page_url))
+            
+            # 背壓：在途太多就先等最舊的一頁解析完（同時維持頁序）
+            while len(pending) >= max_inflight:
+                all_rows.extend(pending.popleft().result())
+            
+            if not next_sel:
+                break
+            page_url = _next_page_url(BeautifulSoup(html, "lxml", parse_only=strainer), next_sel, page_url)
+            if not page_url:
+                break
+        
+        while pending:
+            all_rows.extend(pending.popleft().result())
+    
+    return all_rows
+
+def scrape_static(source_cfg: dict, archive=None, parse_workers: int = None, throttle=None) -> pd.DataFrame:
     start_url = source_cfg["list_url"]
     
     # robots.txt 檢查
@@ -70,26 +167,27 @@ def scrape_static(source_cfg: dict) -> pd.DataFrame:
                      " Chrome/124.0 Safari/537.36"
     })
     
-    all_rows = []
     page_url = start_url
     max_pages = int(source_cfg.get("pagination", {}).get("max_pages", 1))
     next_sel = source_cfg.get("pagination", {}).get("next_selector")
+    workers = int(parse_workers or source_cfg.get("parse_workers", 1))
+    
+    if workers > 1 and max_pages > 1:
+        rows = _scrape_pages_pooled(start_url, source_cfg, session, max_pages, next_sel, workers,
+                                    archive=archive, throttle=throttle)
+        return rows.to_frame()
     
-    for _ in range(max_pages):
-        rows, soup = _scrape_one_page(page_url, source_cfg, session)
+    all_rows = RowBatch.for_source(source_cfg)
+    for page_no in range(1, max_pages + 1):
+        rows, soup = _scrape_one_page(page_url, source_cfg, session, archive=archive, page_no=page_no,
+                                      throttle=throttle)
         all_rows.extend(rows)
         
         if not next_sel:
             break
         
-        next_node = soup.select_one(next_sel)
-        if not next_node:
+        page_url = _next_page_url(soup, next_sel, page_url)
+        if not page_url:
             break
-        
-        href = next_node.get("href", "")
-        if not href:
-            break
-        
-        page_url = urljoin(page_url, href)
     
-    return pd.DataFrame(all_rows)
+    return all_rows.to_frame()
@@ -1,6 +1,6 @@
 from urllib import robotparser
 from urllib.parse import urlparse
-import time, random
+import time, random, asyncio
 
 def allowed_by_robots(url: str, user_agent: str = "Mozilla/5.0") -> bool:
     parsed = urlparse(url)
@@ -14,5 +14,22 @@ def allowed_by_robots(url: str, user_agent: str = "Mozilla/5.0") -> bool:
         # If robots.txt not reachable, be conservative and allow (common practice varies; adjust per policy)
         return True
 
-def polite_delay(base: float = 0.5, jitter: float = 0.5):
+def crawl_delay(url: str, user_agent: str = "Mozilla/5.0"):
+    """robots.txt 的 Crawl-delay（秒）；沒有設定或讀不到回傳 None。"""
+    parsed = urlparse(url)
+    rp = robotparser.RobotFileParser()
+    try:
+        rp.set_url(f"{parsed.scheme}://{parsed.netloc}/robots.txt")
+        rp.read()
+        return rp.crawl_delay(user_agent)
+    except Exception:
+        return None
+
+POLITE_BASE, POLITE_JITTER = 0.5, 0.5
+
+def polite_delay(base: float = POLITE_BASE, jitter: float = POLITE_JITTER):
     time.sleep(base + random.random()*jitter)
+
+async def polite_delay_async(base: float = POLITE_BASE, jitter: float = POLITE_JITTER):
+    """polite_delay 的 async 版：只暫停目前的分頁，不擋住 event loop。"""
+    await asyncio.sleep(base + random.random()*jitter)
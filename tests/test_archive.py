@@ -0,0 +1,49 @@
+from src.scraper.archive import ResponseArchive, read_index, replay_run
+
+PAGE = """
+<html><body>
+  <article class="product_pod"><h3><a href="a.html">{a}</a></h3><p class="price_color">$1.00</p></article>
+  <article class="product_pod"><h3><a href="b.html">{b}</a></h3><p class="price_color">$2.00</p></article>
+</body></html>
+"""
+
+CFG = {
+    "name": "books_static",
+    "type": "static",
+    "item_selector": "article.product_pod",
+    "fields": {"id": "h3 a @ href", "title": "h3 a", "url": "h3 a @ href", "price": "p.price_color"},
+}
+
+def test_record_and_replay(tmp_path):
+    arc = ResponseArchive(str(tmp_path), run_id="r1")
+    arc.record("books_static", 1, "http://x/p1.html", PAGE.format(a="A", b="B"))
+    arc.record("books_static", 2, "http://x/p2.html", PAGE.format(a="C", b="D"))
+    arc.record("books_static", 3, "http://x/p3.html", PAGE.format(a="C", b="D"))  # same body, stored once
+
+    assert len(read_index(arc.dir)) == 3
+    assert len(list((arc.dir / "bodies").glob("*.gz"))) == 2
+
+    df = replay_run("r1", [CFG], root=str(tmp_path), workers=2)
+    assert list(df["title"]) == ["A", "B", "C", "D", "C", "D"]
+    assert df["url"].iloc[0] == "http://x/a.html"
+    assert set(df["source"]) == {"books_static"}
+
+def test_prune_keeps_newest_runs(tmp_path):
+    from src.scraper.archive import prune_runs
+    for run in ["20250101_000000", "20250102_000000", "20250103_000000"]:
+        ResponseArchive(str(tmp_path), run_id=run).record("books_static", 1, "http://x/", "<html></html>")
+    ResponseArchive(str(tmp_path), run_id="20250104_000000")        # 剛開始、尚未寫入的 run
+    assert prune_runs(str(tmp_path), keep=2) == ["20250101_000000"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["20250102_000000", "20250103_000000", "20250104_000000"]
+    assert prune_runs(str(tmp_path), keep=0) == []
+
+def test_dynamic_replay_uses_page_level_fallback(tmp_path):
+    # dynamic 來源：item 內沒有的欄位改在整頁找，id 退回 url（與即時爬取同一個擷取函式）
+    cfg = {"name": "dyn", "type": "dynamic", "item_selector": "div.q",
+           "fields": {"id": "", "title": "span.t", "url": "a @ href", "category": "h1.cat"}}
+    html = '<h1 class="cat">Love</h1><div class="q"><span class="t">A</span><a href="a/">x</a></div>'
+    arc = ResponseArchive(str(tmp_path), run_id="r1")
+    arc.record("dyn", 1, "http://x/tag/love/", html)
+    df = replay_run("r1", [cfg], root=str(tmp_path), workers=1)
+    assert df.iloc[0].to_dict() == {"source": "dyn", "id": "http://x/tag/love/a/", "title": "A",
+                                    "url": "http://x/tag/love/a/", "category": "Love"}
@@ -0,0 +1,52 @@
+import pandas as pd
+from src.pipeline import clean
+from src.pipeline.clean import clean_df, NormCache
+
+RAW = pd.DataFrame({
+    "source": ["a", "a", "b"], "id": ["1", "2", "3"],
+    "date": ["2024-01-02", "", "Jan 5 2024"], "price": ["£1.50", "N/A", "12"],
+})
+
+def test_cached_clean_matches_and_skips_seen_rows(tmp_path, monkeypatch):
+    cols = ["pk", "date", "price"]
+    cache = NormCache(str(tmp_path / "clean.db"))
+    first = clean_df(RAW, cache=cache)
+    assert (cache.hits, cache.misses) == (0, 3)
+    assert first[cols].equals(clean_df(RAW)[cols])
+
+    calls = []
+    monkeypatch.setattr(clean, "normalize_date", lambda v: calls.append(v) or "")
+    raw2 = pd.concat([RAW, pd.DataFrame({"source": ["b"], "id": ["4"], "date": [""], "price": ["7"]})],
+                     ignore_index=True)
+    second = clean_df(raw2, cache=NormCache(str(tmp_path / "clean.db")))
+    assert len(calls) == 1                      # 只有新的那一列重新正規化
+    assert second[cols].head(3).equals(first[cols])
+
+def _clean(snap_dir, cache):
+    import argparse
+    from src.interface.cli import clean_cmd
+    clean_cmd(argparse.Namespace(snapshots=str(snap_dir), cache=str(cache), no_cache=False))
+
+def test_clean_keeps_raw_snapshot_and_reuses_cache(tmp_path, capsys):
+    from src.pipeline.storage import write_snapshot, latest_snapshot, load_snapshot
+    snaps = tmp_path / "snaps"
+    raw_path = write_snapshot(RAW, str(snaps))
+    raw_bytes = open(raw_path, "rb").read()
+
+    for _ in range(3):
+        _clean(snaps, tmp_path / "clean.db")
+    out = capsys.readouterr().out
+    assert "Normalized 3 new rows, reused 0 cached" in out
+    assert out.count("Normalized 0 new rows, reused 3 cached") == 2     # 重跑一律命中
+    assert open(raw_path, "rb").read() == raw_bytes                      # 原始快照沒被覆寫
+    assert latest_snapshot(str(snaps)).endswith(".clean.csv")
+    assert latest_snapshot(str(snaps), raw=True) == raw_path
+    assert list(load_snapshot(str(snaps))["date"]) == ["20240102", "", "20240105"]
+
+def test_sharded_snapshot_hits_same_cache(tmp_path, capsys):
+    from src.pipeline.storage import write_snapshot
+    write_snapshot(RAW, str(tmp_path / "flat"))
+    write_snapshot(RAW, str(tmp_path / "sharded"), shards=2)
+    _clean(tmp_path / "flat", tmp_path / "clean.db")
+    _clean(tmp_path / "sharded", tmp_path / "clean.db")
+    assert "Normalized 0 new rows, reused 3 cached" in capsys.readouterr().out
@@ -0,0 +1,24 @@
+import pandas as pd
+from src.interface.dashboard_data import typed_frame, KeywordIndex
+
+def _df():
+    return pd.DataFrame([
+        {"source": "books", "id": "1", "title": "A Light in the Attic", "author": "", "url": "http://x/a", "category": "", "date": "2024-01-02", "price": "£51.77"},
+        {"source": "books", "id": "2", "title": "Tipping the Velvet", "author": "", "url": "http://x/b", "category": "", "date": "20240105", "price": "$1,234.50"},
+        {"source": "quotes", "id": "3", "title": "資訊檢索與生成式人工智慧", "author": "Albert Einstein", "url": "", "category": "life", "date": "", "price": ""},
+    ])
+
+def test_typed_frame_columns():
+    df = typed_frame(_df())
+    assert list(df["_price_num"].iloc[:2]) == [51.77, 1234.5]
+    assert df["_date_dt"].iloc[0] == pd.Timestamp("2024-01-02")
+    assert df["_date_dt"].iloc[1] == pd.Timestamp("2024-01-05")
+    assert pd.isna(df["_date_dt"].iloc[2])
+    assert df["pk"].iloc[0] == "books::1"
+
+def test_keyword_index_matches_substring_scan():
+    df = typed_frame(_df())
+    idx = KeywordIndex.from_frame(df)
+    for kw in ["light", "ight", "the", "EINSTEIN", "檢索", "生成式人工", "x/b", "nope", "索與生"]:
+        expected = [i for i, h in enumerate(idx.hay) if kw.lower() in h]
+        assert list(idx.search(kw)) == expected, kw
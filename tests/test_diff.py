@@ -21,3 +21,22 @@ def test_diff_basic(tmp_path):
     assert len(res["new"]) == 1
     assert len(res["deleted"]) == 1
     assert len(res["changed"]) == 1
+
+def test_changes_persisted_and_indexed(tmp_path):
+    from src.pipeline.diff import write_outputs, load_changes
+    changed = [
+        {"pk": "s::2", "diffs": {"title": {"old": "B", "new": "B2"}, "price": {"old": "1", "new": "2"}}},
+        {"pk": "s::1", "diffs": {"title": {"old": "A", "new": "A2"}}},
+    ]
+    empty = pd.DataFrame(columns=["pk"])
+    res = {"new": empty, "deleted": empty, "changed": changed}
+    write_outputs(res, str(tmp_path), run_id="20250101_000000")
+    write_outputs({**res, "changed": changed[:1]}, str(tmp_path), run_id="20250102_000000")
+    write_outputs({**res, "changed": []}, str(tmp_path), run_id="20250103_000000")
+
+    run1 = load_changes(str(tmp_path), run_id="20250101_000000")
+    assert list(run1["pk"]) == ["s::1", "s::2", "s::2"]
+    hist = load_changes(str(tmp_path), pk="s::2")
+    assert list(hist["run_id"]) == ["20250101_000000"] * 2 + ["20250102_000000"] * 2
+    assert set(hist["column"]) == {"title", "price"}
+    assert load_changes(str(tmp_path), pk="s::9").empty
@@ -0,0 +1,112 @@
+import asyncio
+import pytest
+import playwright.async_api
+from urllib.parse import urlparse
+from src.scraper import dynamic_scraper
+from src.pipeline.jobqueue import SQLiteJobQueue
+
+CFG = {
+    "name": "quotes_dynamic_js",
+    "type": "dynamic",
+    "list_url": "http://x/js/",
+    "item_selector": "div.quote",
+    "pagination": {"url_template": "http://x/js/page/{page}/", "max_pages": 8, "concurrency": 3},
+    "fields": {"id": "span.text", "title": "span.text"},
+}
+
+class FakeResp:
+    status = 200
+    headers = {}
+
+class FakeTab:
+    stats = None    # 每個測試由 fresh_stats 重設
+
+    async def goto(self, url, **kw):
+        s = self.stats
+        s["active"] += 1; s["peak"] = max(s["peak"], s["active"]); s["visited"].append(url)
+        await asyncio.sleep(0.01 if url.endswith("/1/") else 0)   # 第一頁最慢，驗證依頁序合併
+        s["active"] -= 1
+        self.url = url
+        return FakeResp()
+
+    async def wait_for_selector(self, *a, **kw):
+        pass
+
+    async def content(self):
+        n = int(self.url.rstrip("/").rsplit("/", 1)[1])
+        quotes = "".join(f'<div class="quote"><span class="text">q{n}-{i}</span></div>' for i in range(2))
+        return f"<html><body>{quotes if n <= 5 else ''}</body></html>"
+
+    async def close(self):
+        pass
+
+class FakeBrowser:
+    async def new_context(self):
+        return self
+
+    async def new_page(self):
+        return FakeTab()
+
+    async def close(self):
+        pass
+
+class FakePlaywright:
+    class chromium:
+        @staticmethod
+        async def launch(**kw):
+            return FakeBrowser()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *a):
+        pass
+
+@pytest.fixture(autouse=True)
+def fresh_stats(monkeypatch):
+    monkeypatch.setattr(FakeTab, "stats", {"active": 0, "peak": 0, "visited": []})
+    monkeypatch.setattr(playwright.async_api, "async_playwright", FakePlaywright)
+    monkeypatch.setattr(dynamic_scraper, "allowed_by_robots", lambda url: True)
+    monkeypatch.setattr(dynamic_scraper.asyncio, "sleep", _no_sleep)
+
+def test_url_template_fans_out_and_keeps_page_order(monkeypatch):
+    df = dynamic_scraper.scrape_dynamic(CFG)
+    assert list(df["title"]) == [f"q{n}-{i}" for n in range(1, 6) for i in range(2)]
+    assert FakeTab.stats["peak"] == 3
+
+_real_sleep = asyncio.sleep
+
+async def _no_sleep(delay, *a):
+    await _real_sleep(min(delay, 0.01))
+
+def test_fan_out_with_sqlite_queue_throttle(tmp_path):
+    # worker 指令實際傳入的 throttle：在 to_thread 的執行緒裡用自己的 SQLite 連線
+    queue = SQLiteJobQueue(str(tmp_path / "queue.db"))
+    throttled = []
+    def throttle(url):
+        throttled.append(url)
+        queue.throttle(urlparse(url).netloc, 0)
+
+    df = dynamic_scraper.scrape_dynamic(CFG, throttle=throttle)
+    assert len(df) == 10
+    assert len(throttled) == len(FakeTab.stats["visited"])
+
+def test_blocking_throttle_does_not_stall_other_tabs():
+    import time
+    def throttle(url):
+        if url.endswith("/1/"):
+            time.sleep(0.1)                               # 第一頁在等 host 時段
+
+    df = dynamic_scraper.scrape_dynamic(CFG, throttle=throttle)
+    assert len(df) == 10
+    assert FakeTab.stats["visited"][0] != "http://x/js/page/1/"   # 其他分頁先走了
+
+def test_json_mode_falls_back_to_browser(monkeypatch):
+    from src.scraper import json_scraper
+    monkeypatch.setattr(json_scraper, "allowed_by_robots", lambda url: True)
+    monkeypatch.setattr(json_scraper, "_fetch_page", lambda *a, **k: "<html><body>no data</body></html>")
+    monkeypatch.setattr(json_scraper, "_capture_xhr", lambda *a, **k: None)
+
+    df = dynamic_scraper.scrape_dynamic(dict(CFG, mode="json"))
+    assert list(df["title"]) == [f"q{n}-{i}" for n in range(1, 6) for i in range(2)]
+    assert FakeTab.stats["visited"]                    # 走了瀏覽器路徑
@@ -0,0 +1,67 @@
+import csv, multiprocessing, os, queue, threading
+from src.scraper import error_handler
+from src.scraper.error_handler import ErrorLogSink, LOG_COLUMNS
+
+def _storm(path, n):
+    sink = ErrorLogSink(path, batch_size=7, flush_interval=0.05)
+    for i in range(n):
+        sink.put({"source": "s", "url": f"http://x/{i}", "status": 503, "attempt": 1, "error": "HTTP 503"})
+    sink.close()
+
+def test_sink_batches_across_threads_and_processes(tmp_path):
+    path = str(tmp_path / "logs" / "error_log.csv")
+    sink = ErrorLogSink(path, batch_size=7, flush_interval=0.05)
+    threads = [threading.Thread(target=lambda: [sink.put({"url": "u", "attempt": 2}) for _ in range(50)])
+               for _ in range(4)]
+    procs = [multiprocessing.get_context("spawn").Process(target=_storm, args=(path, 100)) for _ in range(2)]
+    for t in threads + procs:
+        t.start()
+    for t in threads + procs:
+        t.join()
+    sink.flush()
+
+    rows = list(csv.reader(open(path, encoding="utf-8")))
+    assert rows[0] == LOG_COLUMNS
+    assert len(rows) == 1 + 200 + 200
+    assert all(len(r) == len(LOG_COLUMNS) for r in rows)
+
+def test_log_error_records_source_status_latency(tmp_path, monkeypatch):
+    sink = ErrorLogSink(str(tmp_path / "e.csv"))
+    monkeypatch.setattr(error_handler, "DEFAULT_SINK", sink)
+    with error_handler.error_source("books_static"):
+        error_handler.log_retry("http://x/1", 3, "HTTP 503", 503, 0.25, 2.0)
+    sink.flush()
+    row = list(csv.DictReader(open(tmp_path / "e.csv", encoding="utf-8")))[0]
+    assert (row["source"], row["status"], row["attempt"], row["latency_ms"]) == ("books_static", "503", "3", "250")
+
+def test_dropped_records_are_reported(tmp_path, capsys):
+    sink = ErrorLogSink(str(tmp_path / "e.csv"), max_queue=2, flush_interval=0.05)
+    # 背景 thread 先不啟動，queue 塞滿後的紀錄一定會被丟掉
+    sink._pid, sink._queue = os.getpid(), queue.Queue(maxsize=2)
+    sink._thread = threading.Thread(target=sink._run, daemon=True)
+    for i in range(5):
+        sink.put({"url": f"u{i}"})
+    assert sink.dropped == 3
+    sink._thread.start()
+    sink.flush()
+
+    rows = list(csv.DictReader(open(tmp_path / "e.csv", encoding="utf-8")))
+    assert [r["url"] for r in rows[:2]] == ["u0", "u1"]
+    assert rows[-1]["source"] == "error_log" and "dropped 3 records" in rows[-1]["error"]
+    assert "dropped 3 records" in capsys.readouterr().err
+    assert sink.dropped == 0
+    sink.close()
+
+def test_old_format_log_is_rotated(tmp_path):
+    path = tmp_path / "error_log.csv"
+    old = "2025-01-01T00:00:00,http://x/1,2,HTTP 503\r\n"     # 舊版：4 欄、沒有表頭
+    path.write_text(old, encoding="utf-8", newline="")
+    (tmp_path / "error_log.legacy.csv").write_text("older\r\n", encoding="utf-8")
+    sink = ErrorLogSink(str(path))
+    sink.put({"url": "http://x/2", "attempt": 1})
+    sink.close()
+
+    rows = list(csv.reader(open(path, encoding="utf-8")))
+    assert rows[0] == LOG_COLUMNS and len(rows) == 2
+    assert (tmp_path / "error_log.legacy.1.csv").read_text(encoding="utf-8") == old.replace("\r\n", "\n")
+    assert (tmp_path / "error_log.legacy.csv").read_text(encoding="utf-8") == "older\n"
@@ -0,0 +1,50 @@
+import pandas as pd
+from src.pipeline.diff import diff_snapshots
+from src.pipeline.history import update_from_diff, HistoryStore
+
+def _snap(tmp_path, ts, rows):
+    path = tmp_path / f"snapshot_{ts}.csv"
+    pd.DataFrame(rows).to_csv(path, index=False)
+    return str(path)
+
+def _row(i, price, title=None):
+    return {"source": "s", "id": str(i), "pk": f"s::{i}", "title": title or f"T{i}", "price": price,
+            "last_seen_at": "x"}
+
+def test_history_intervals_and_price_drops(tmp_path):
+    db = str(tmp_path / "h.db")
+    s1 = _snap(tmp_path, "20250101_000000", [_row(1, "10.0"), _row(2, "20.0"), _row(3, "30.0")])
+    s2 = _snap(tmp_path, "20250120_000000", [_row(1, "8.0"), _row(2, "20.0", "T2b")])
+    s3 = _snap(tmp_path, "20250210_000000", [_row(1, "9.0"), _row(2, "25.0", "T2b"), _row(4, "5.0")])
+
+    update_from_diff(db, s1, s2, diff_snapshots(s1, s2))
+    store = update_from_diff(db, s2, s3, diff_snapshots(s2, s3))
+    assert store.snapshot == "snapshot_20250210_000000"
+
+    h = store.field_history("s::1", "price")
+    assert list(h["value"]) == ["10.0", "8.0", "9.0"]
+    assert list(h["valid_from"]) == ["2025-01-01T00:00:00", "2025-01-20T00:00:00", "2025-02-10T00:00:00"]
+    assert list(h["valid_to"].fillna("")) == ["2025-01-20T00:00:00", "2025-02-10T00:00:00", ""]
+
+    # 已刪除的 item 所有區間都關閉
+    assert store.field_history("s::3")["valid_to"].notna().all()
+
+    # 15 天前（2025-01-26）s::1 為 8.0 → 9.0 不是下降；30 天前（2025-01-11）為 10.0 → 下降
+    assert store.price_drops(days=15).empty
+    drops = store.price_drops(days=30)
+    assert list(drops["pk"]) == ["s::1"] and drops["drop"].iloc[0] == 1.0
+
+    # 重複套用同一次 diff 不會重複寫入
+    update_from_diff(db, s2, s3, diff_snapshots(s2, s3))
+    assert len(HistoryStore(db).field_history("s::1", "price")) == 3
+
+def test_history_resyncs_after_gap(tmp_path):
+    db = str(tmp_path / "h.db")
+    s1 = _snap(tmp_path, "20250101_000000", [_row(1, "10.0")])
+    s2 = _snap(tmp_path, "20250102_000000", [_row(1, "11.0")])
+    s3 = _snap(tmp_path, "20250103_000000", [_row(1, "12.0"), _row(2, "1.0")])
+    update_from_diff(db, s1, s2, diff_snapshots(s1, s2))
+    # 跳過一次 → 以目前狀態與 s3 比對
+    store = update_from_diff(db, s1, s3, diff_snapshots(s1, s3))
+    assert list(store.field_history("s::1", "price")["value"]) == ["10.0", "11.0", "12.0"]
+    assert set(store.current_state()["pk"]) == {"s::1", "s::2"}
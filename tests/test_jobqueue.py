@@ -0,0 +1,129 @@
+import time
+import pytest
+from src.pipeline.jobqueue import SQLiteJobQueue, RedisJobQueue
+
+class FakeRedis:
+    """只實作 RedisJobQueue 用到的指令（decode_responses=True 行為）。"""
+    def __init__(self):
+        self.kv, self.hashes, self.lists, self.expire, self.zsets = {}, {}, {}, {}, {}
+
+    def incr(self, k):
+        self.kv[k] = int(self.kv.get(k, 0)) + 1
+        return self.kv[k]
+    def hset(self, k, mapping):
+        self.hashes.setdefault(k, {}).update({f: str(v) for f, v in mapping.items()})
+    def hget(self, k, f):
+        return self.hashes.get(k, {}).get(f)
+    def hgetall(self, k):
+        return dict(self.hashes.get(k, {}))
+    def hincrby(self, k, f, n):
+        h = self.hashes.setdefault(k, {})
+        h[f] = str(int(h.get(f, 0)) + n)
+        return int(h[f])
+    def rpush(self, k, v):
+        self.lists.setdefault(k, []).append(str(v))
+    def lpop(self, k):
+        lst = self.lists.get(k) or []
+        return lst.pop(0) if lst else None
+    def lrange(self, k, a, b):
+        return list(self.lists.get(k, []))
+    def zadd(self, k, mapping):
+        self.zsets.setdefault(k, {}).update({str(m): float(s) for m, s in mapping.items()})
+    def zrangebyscore(self, k, lo, hi):
+        z = self.zsets.get(k, {})
+        return sorted((m for m, s in z.items() if lo <= s <= hi), key=z.get)
+    def zrem(self, k, m):
+        return 1 if self.zsets.get(k, {}).pop(str(m), None) is not None else 0
+    def set(self, k, v, nx=False, px=None):
+        if nx and self.pttl(k) > 0:
+            return None
+        self.kv[k] = v
+        self.expire[k] = time.time() + px / 1000
+        return True
+    def pttl(self, k):
+        return int((self.expire.get(k, 0) - time.time()) * 1000)
+
+@pytest.fixture(params=["sqlite", "redis"])
+def queue(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteJobQueue(str(tmp_path / "q.db"))
+    return RedisJobQueue(FakeRedis())
+
+@pytest.fixture(params=["sqlite", "redis"])
+def expiring_queue(request, tmp_path):
+    # lease 立刻過期，模擬 worker 領了工作後當掉
+    if request.param == "sqlite":
+        return SQLiteJobQueue(str(tmp_path / "q.db"), lease_seconds=-1)
+    return RedisJobQueue(FakeRedis(), lease_seconds=-1)
+
+def test_job_lifecycle(queue):
+    for name in ["a", "b", "c"]:
+        queue.put("r1", {"source": {"name": name}})
+
+    jobs = [queue.claim("w1") for _ in range(3)]
+    assert [j["payload"]["source"]["name"] for j in jobs] == ["a", "b", "c"]
+    assert queue.claim("w1") is None
+
+    queue.complete(jobs[2]["id"], b"C")
+    queue.complete(jobs[0]["id"], b"A")
+    queue.fail(jobs[1]["id"], "boom", max_attempts=2)   # 放回佇列
+    retry = queue.claim("w2")
+    assert retry["id"] == jobs[1]["id"] and retry["attempts"] == 2
+    queue.fail(retry["id"], "boom", max_attempts=2)     # 用完次數 → failed
+
+    assert queue.run_status("r1") == {"done": 2, "failed": 1}
+    assert queue.results("r1") == [b"A", b"C"]
+
+def test_throttle_spaces_requests(queue):
+    t0 = time.time()
+    for _ in range(3):
+        queue.throttle("example.com", 0.05)
+    assert time.time() - t0 >= 0.09
+
+def test_lost_lease_is_reclaimed_until_attempts_run_out(expiring_queue):
+    q = expiring_queue
+    q.put("r1", {"source": {"name": "crashy"}})
+    first = q.claim("w1", max_attempts=2)              # w1 當掉，沒有 complete / fail
+    second = q.claim("w2", max_attempts=2)
+    assert second["id"] == first["id"] and second["attempts"] == 2
+    assert q.claim("w3", max_attempts=2) is None        # 第二次也當掉 → 次數用完
+    assert q.run_status("r1") == {"failed": 1}
+
+def test_late_completion_is_not_rerun(expiring_queue):
+    q = expiring_queue
+    q.put("r1", {"source": {"name": "slow"}})
+    job = q.claim("w1")
+    q.complete(job["id"], b"X")                          # lease 過期後才回報完成
+    assert q.claim("w2") is None
+    assert q.run_status("r1") == {"done": 1}
+
+def _coord_args(tmp_path, **kw):
+    import argparse
+    cfg = tmp_path / "sources.yaml"
+    cfg.write_text("sources:\n  - {name: a, type: static}\n  - {name: b, type: static}\n")
+    base = dict(config=str(cfg), queue=str(tmp_path / "q.db"), out=str(tmp_path / "snaps"), shards=None,
+                shard_by="pk", run=None, no_wait=False, poll=0.01, timeout=5, allow_partial=False)
+    base.update(kw)
+    return argparse.Namespace(**base)
+
+def test_coordinate_refuses_unknown_run_and_partial_results(tmp_path):
+    import gzip
+    from src.interface.cli import coordinate_cmd
+    from src.pipeline.storage import list_snapshots
+
+    with pytest.raises(SystemExit):
+        coordinate_cmd(_coord_args(tmp_path, run="doesnotexist"))
+
+    coordinate_cmd(_coord_args(tmp_path, no_wait=True))
+    q = SQLiteJobQueue(str(tmp_path / "q.db"))
+    a, b = q.claim("w"), q.claim("w")
+    q.complete(a["id"], gzip.compress(b"source,id\na,1\n"))
+    q.fail(b["id"], "boom", max_attempts=1)
+    run_id = a["run_id"]
+
+    with pytest.raises(SystemExit):
+        coordinate_cmd(_coord_args(tmp_path, run=run_id))
+    assert list_snapshots(str(tmp_path / "snaps")) == []
+
+    coordinate_cmd(_coord_args(tmp_path, run=run_id, allow_partial=True))
+    assert len(list_snapshots(str(tmp_path / "snaps"))) == 1
@@ -0,0 +1,133 @@
+import json
+import pytest
+from src.scraper import json_scraper
+from src.scraper.json_scraper import json_path, scrape_json, _next_xhr_url
+
+CFG = {
+    "name": "quotes_json",
+    "list_url": "http://x/js/",
+    "mode": "json",
+    "pagination": {"next_selector": "li.next a", "max_pages": 5},
+    "json": {"fields": {"id": "text", "title": "text", "author": "author.name", "category": "tags[0]"}},
+    "fields": {"id": "span.text", "title": "span.text", "url": "", "author": "small.author", "category": "a.tag"},
+}
+
+def _page(n, last):
+    data = [{"text": f"q{n}-{i}", "author": {"name": f"A{i}"}, "tags": ["t1", "t2"]} for i in range(2)]
+    nxt = "" if n == last else f'<li class="next"><a href="/js/page/{n+1}/">Next</a></li>'
+    return f"<html><script>var data = {json.dumps(data)};\nfor (var i in data) {{}}</script><ul>{nxt}</ul></html>"
+
+def test_json_path():
+    d = {"a": {"b": [{"c": 1}, {"c": 2}]}}
+    assert json_path(d, "$.a.b[1].c") == 2
+    assert json_path(d, "a.b[*].c") == [1, 2]
+    assert json_path(d, "a.x") is None
+
+def test_inline_json_pages_without_browser(monkeypatch):
+    pages = {"http://x/js/": _page(1, 3), "http://x/js/page/2/": _page(2, 3), "http://x/js/page/3/": _page(3, 3)}
+    monkeypatch.setattr(json_scraper, "allowed_by_robots", lambda url: True)
+    monkeypatch.setattr(json_scraper, "_fetch_page", lambda url, *a, **k: pages[url])
+    monkeypatch.setattr(json_scraper, "_capture_xhr", lambda *a, **k: (_ for _ in ()).throw(AssertionError("browser")))
+
+    df = scrape_json(CFG)
+    assert list(df["title"]) == ["q1-0", "q1-1", "q2-0", "q2-1", "q3-0", "q3-1"]
+    assert list(df["author"][:2]) == ["A0", "A1"]
+    assert set(df["category"]) == {"t1"}
+    assert list(df["id"]) == list(df["title"])
+
+def test_next_xhr_url():
+    jcfg = {"has_next": "has_next"}
+    assert _next_xhr_url("http://x/api/quotes?page=1", {"has_next": True}, jcfg) == "http://x/api/quotes?page=2"
+    assert _next_xhr_url("http://x/api/quotes?page=1", {"has_next": False}, jcfg) is None
+    assert _next_xhr_url("http://x/api/q", {"next": "/api/q?c=2"}, {"next": "next"}) == "http://x/api/q?c=2"
+
+# ---- XHR 擷取：假的 sync Playwright，goto 時觸發 response 事件 ----
+class FakeXhr:
+    def __init__(self, url, body, kind="xhr"):
+        self.url, self._body = url, body
+        self.request = type("Req", (), {"resource_type": kind})()
+
+    def text(self):
+        return self._body
+
+class FakeSyncPage:
+    def __init__(self, responses, fail_first):
+        self.responses, self.fail_first, self.gotos, self.handlers = responses, fail_first, 0, []
+
+    def on(self, event, cb):
+        self.handlers.append(cb)
+
+    def goto(self, url, **kw):
+        self.gotos += 1
+        if self.fail_first and self.gotos == 1:
+            from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
+            raise PlaywrightTimeoutError("slow")
+        for r in self.responses:
+            for cb in self.handlers:
+                cb(r)
+        return type("Resp", (), {"status": 200, "headers": {}})()
+
+def _fake_sync_playwright(page):
+    class Browser:
+        def new_page(self):
+            return page
+        def close(self):
+            pass
+    class PW:
+        chromium = type("Chromium", (), {"launch": staticmethod(lambda **kw: Browser())})
+        def __enter__(self):
+            return self
+        def __exit__(self, *a):
+            pass
+    return PW
+
+class RecordingArchive:
+    def __init__(self):
+        self.records = []
+    def record(self, source, page, url, body, status=200):
+        self.records.append((page, url))
+
+API = {n: json.dumps({"has_next": n < 3, "quotes": [{"text": f"q{n}-{i}"} for i in range(2)]}) for n in (1, 2, 3)}
+XHR_CFG = dict(CFG, json={"items": "quotes", "has_next": "has_next", "fields": {"id": "text", "title": "text"}})
+
+@pytest.fixture
+def xhr_site(monkeypatch, tmp_path):
+    import playwright.sync_api
+    from src.scraper import retry, error_handler
+    # 重試紀錄寫到暫存的 log，斷路器 / 重試額度也不和其他測試共用
+    sink = error_handler.ErrorLogSink(str(tmp_path / "e.csv"))
+    monkeypatch.setattr(error_handler, "DEFAULT_SINK", sink)
+    page = FakeSyncPage([FakeXhr("http://x/static.js", "var a = 1;", kind="script"),
+                         FakeXhr("http://x/api/quotes?page=1", API[1])], fail_first=True)
+    monkeypatch.setattr(playwright.sync_api, "sync_playwright", _fake_sync_playwright(page))
+    monkeypatch.setattr(retry.time, "sleep", lambda s: None)
+    monkeypatch.setattr(json_scraper, "allowed_by_robots", lambda url: True)
+    fetched = []
+    def fetch(url, cfg, session, archive=None, page_no=1, throttle=None):
+        fetched.append(url)
+        body = "<html><body>loading…</body></html>" if url == "http://x/js/" else API[int(url[-1])]
+        if archive is not None:
+            archive.record(cfg["name"], page_no, url, body)
+        return body
+    monkeypatch.setattr(json_scraper, "_fetch_page", fetch)
+    yield page, fetched, retry.RetryPolicy()
+    sink.close()
+
+def test_capture_xhr_retries_and_pages_api(xhr_site):
+    page, fetched, policy = xhr_site
+    archive = RecordingArchive()
+    df = scrape_json(XHR_CFG, archive=archive, policy=policy)
+    assert page.gotos == 2                                  # 第一次逾時，經 RetryPolicy 重試
+    assert list(df["title"]) == ["q1-0", "q1-1", "q2-0", "q2-1", "q3-0", "q3-1"]
+    assert fetched == ["http://x/js/", "http://x/api/quotes?page=2", "http://x/api/quotes?page=3"]
+    # 只封存 API 回應（列表頁不含資料），且在成功後才寫入
+    assert archive.records == [(1, "http://x/api/quotes?page=1"), (2, "http://x/api/quotes?page=2"),
+                               (3, "http://x/api/quotes?page=3")]
+
+def test_failed_json_path_archives_nothing(xhr_site, monkeypatch):
+    monkeypatch.setattr(json_scraper, "_fetch_page", lambda url, *a, **k: "<html></html>" if url == "http://x/js/"
+                        else (_ for _ in ()).throw(json_scraper.requests.ConnectionError("down")))
+    archive = RecordingArchive()
+    with pytest.raises(json_scraper.JsonSourceUnavailable):
+        scrape_json(XHR_CFG, archive=archive, policy=xhr_site[2])
+    assert archive.records == []
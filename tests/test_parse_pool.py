@@ -0,0 +1,35 @@
+from src.scraper import static_scraper
+
+def _page(n, last):
+    nxt = "" if n == last else f'<li class="next"><a href="p{n+1}.html">next</a></li>'
+    items = "".join(f'<article class="product_pod"><h3><a href="b{n}_{i}.html">T{n}-{i}</a></h3></article>' for i in range(3))
+    return f"<html><body>{items}<ul class='pager'>{nxt}</ul></body></html>"
+
+CFG = {
+    "name": "books_static",
+    "list_url": "http://x/p1.html",
+    "item_selector": "article.product_pod",
+    "pagination": {"next_selector": "li.next a", "max_pages": 10},
+    "fields": {"id": "h3 a @ href", "title": "h3 a"},
+}
+
+def test_pooled_matches_inline(monkeypatch):
+    pages = {f"http://x/p{n}.html": _page(n, 6) for n in range(1, 7)}
+    monkeypatch.setattr(static_scraper, "allowed_by_robots", lambda url: True)
+    monkeypatch.setattr(static_scraper, "_fetch_page", lambda url, *a, **k: pages[url])
+
+    inline = static_scraper.scrape_static(CFG, parse_workers=1)
+    pooled = static_scraper.scrape_static(CFG, parse_workers=2)
+    assert len(inline) == 18
+    assert list(pooled["title"]) == list(inline["title"])
+
+def test_strainers_keep_only_matching_subtrees():
+    from bs4 import BeautifulSoup
+    html = ("<ul class='side'><li>Travel</li><li>Poetry</li></ul>" + _page(1, 2))
+    nav = BeautifulSoup(html, "lxml", parse_only=static_scraper._strain_for("li.next a"))
+    assert [li.get_text() for li in nav.find_all("li")] == ["next"]           # 側欄的 <li> 不建樹
+    items = BeautifulSoup(html, "lxml", parse_only=static_scraper._strain_for(CFG["item_selector"]))
+    assert {t.name for t in items.find_all(True)} == {"article", "h3", "a"}
+    assert static_scraper._strain_for("ul.pager + div") is None                # 無法安全縮小 → 整頁解析
+    rows = static_scraper.extract_rows(html, CFG, "http://x/p1.html")
+    assert list(rows.to_frame()["title"]) == ["T1-0", "T1-1", "T1-2"]
@@ -0,0 +1,72 @@
+import pytest
+from datetime import datetime, timezone
+from src.scraper import retry
+from src.scraper.retry import RetryPolicy, CircuitBreaker, CircuitOpenError, parse_retry_after
+
+class Resp:
+    def __init__(self, status, retry_after=None):
+        self.status = status
+        self.retry_after = retry_after
+
+def _call(policy, url, fn):
+    return policy.call(url, fn, status_of=lambda r: r.status, retry_after_of=lambda r: r.retry_after)
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    slept = []
+    monkeypatch.setattr(retry.time, "sleep", slept.append)
+    return slept
+
+def test_parse_retry_after():
+    now = datetime(2015, 10, 21, 7, 27, 0, tzinfo=timezone.utc)
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT", now=now) == 60.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:00:00 GMT", now=now) == 0.0
+    assert parse_retry_after("soon") is None
+
+def test_retries_then_succeeds_with_jittered_backoff(no_sleep):
+    seq = iter([Resp(503), Resp(503), Resp(200)])
+    policy = RetryPolicy(base_delay=1.0, max_delay=10.0)
+    assert _call(policy, "http://a/x", lambda: next(seq)).status == 200
+    assert len(no_sleep) == 2
+    assert all(1.0 <= w <= 10.0 for w in no_sleep)
+
+def test_retry_after_header_is_respected(no_sleep):
+    seq = iter([Resp(429, retry_after="7"), Resp(200)])
+    _call(RetryPolicy(), "http://a/x", lambda: next(seq))
+    assert no_sleep == [7.0]
+
+def test_breaker_fast_fails_bad_host(no_sleep):
+    policy = RetryPolicy(max_retries=2, breaker=CircuitBreaker(failure_threshold=3, reset_timeout=60))
+    calls = []
+    def bad():
+        calls.append(1)
+        return Resp(500)
+
+    assert _call(policy, "http://bad/1", bad).status == 500   # 2 次失敗
+    assert _call(policy, "http://bad/2", bad).status == 500   # 第 3 次失敗 → 開啟
+    n = len(calls)
+    with pytest.raises(CircuitOpenError):
+        _call(policy, "http://bad/3", bad)
+    assert len(calls) == n
+    # 其他 host 不受影響
+    assert _call(policy, "http://good/1", lambda: Resp(200)).status == 200
+
+def test_retry_budget_per_host(no_sleep):
+    policy = RetryPolicy(max_retries=4, retry_budget=1, breaker=CircuitBreaker(failure_threshold=100))
+    _call(policy, "http://a/1", lambda: Resp(503))
+    assert len(no_sleep) == 1          # 預算只夠重試一次
+    _call(policy, "http://a/2", lambda: Resp(503))
+    assert len(no_sleep) == 1
+
+def test_retry_budget_refills_after_window(no_sleep, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(retry.time, "monotonic", lambda: clock[0])
+    policy = RetryPolicy(max_retries=4, retry_budget=1, budget_window=60,
+                         breaker=CircuitBreaker(failure_threshold=100))
+    _call(policy, "http://a/1", lambda: Resp(503))
+    _call(policy, "http://a/2", lambda: Resp(503))
+    assert len(no_sleep) == 1          # 視窗內預算已用完
+    clock[0] += 61
+    _call(policy, "http://a/3", lambda: Resp(503))
+    assert len(no_sleep) == 2          # 視窗過後預算回補
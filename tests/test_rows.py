@@ -0,0 +1,19 @@
+from src.scraper.rows import RowBatch, batches_to_frame
+
+def test_rowbatch_frame_columns_and_source():
+    b = RowBatch("s1", ["title", "price"])
+    b.append({"title": "A", "price": "1", "id": "A"})
+    b.append({"title": "B"})
+    df = b.to_frame()
+    assert list(df.columns) == ["title", "price", "source", "id"]
+    assert str(df["source"].dtype) == "category"
+    assert list(df["price"]) == ["1", ""]
+
+def test_batches_to_frame_keeps_order():
+    a, b = RowBatch("s1", ["id"]), RowBatch("s2", ["id"])
+    a.append({"id": "1"}); b.append({"id": "2"})
+    a2 = RowBatch("s1", ["id"]); a2.append({"id": "3"})
+    df = batches_to_frame([a, a2, b])
+    assert list(df["id"]) == ["1", "3", "2"]
+    assert list(df["source"]) == ["s1", "s1", "s2"]
+    assert str(df["source"].dtype) == "category"
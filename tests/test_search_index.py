@@ -0,0 +1,62 @@
+import pandas as pd
+from src.pipeline.search_index import SearchIndex
+
+def _df(rows):
+    return pd.DataFrame([{"source": "s", "id": i, "pk": f"s::{i}", "title": t, "author": a} for i, t, a in rows])
+
+BASE = [
+    ("1", "資訊檢索導論", "王小明"),
+    ("2", "生成式人工智慧", "李大華"),
+    ("3", "A Light in the Attic", "Shel Silverstein"),
+    ("4", "Light and Shadow: light studies", ""),
+]
+
+def test_bm25_ranking_and_cjk(tmp_path):
+    idx = SearchIndex(str(tmp_path / "i.db"))
+    idx.rebuild(_df(BASE), snapshot="snap1")
+    assert len(idx) == 4 and idx.snapshot == "snap1"
+    assert list(idx.search("檢索")["pk"]) == ["s::1"]
+    assert list(idx.search("人工智慧")["pk"])[0] == "s::2"
+    # tf 較高的文件排前面
+    assert list(idx.search("light")["pk"]) == ["s::4", "s::3"]
+    assert idx.search("nothing").empty
+
+def test_incremental_update_matches_rebuild(tmp_path):
+    curr_rows = [BASE[0], ("2", "生成式AI入門", "李大華"), BASE[2], ("5", "Dark Attic", "")]
+    inc = SearchIndex(str(tmp_path / "inc.db"))
+    inc.rebuild(_df(BASE), snapshot="snap1")
+    inc.update(_df(curr_rows), changed_pks=["s::2", "s::5"], deleted_pks=["s::4"], snapshot="snap2")
+
+    full = SearchIndex(str(tmp_path / "full.db"))
+    full.rebuild(_df(curr_rows), snapshot="snap2")
+
+    assert len(inc) == len(full) == 4
+    for q in ["attic", "生成式", "light", "ai"]:
+        pd.testing.assert_frame_equal(inc.search(q), full.search(q))
+
+def test_reads_never_rebuild_and_diff_tracks_file_version(tmp_path, monkeypatch):
+    import types, datetime
+    from src.pipeline import storage
+    from src.pipeline.diff import diff_snapshots
+    from src.pipeline.search_index import open_index, update_from_diff
+    snaps, index = str(tmp_path / "snaps"), str(tmp_path / "i.db")
+
+    def snapshot(rows, sec):
+        stamp = datetime.datetime(2025, 1, 1, 0, 0, sec)
+        monkeypatch.setattr(storage, "dt", types.SimpleNamespace(datetime=types.SimpleNamespace(now=lambda: stamp)))
+        return storage.write_snapshot(_df(rows), snaps)
+
+    snapshot(BASE, 0)
+    snapshot(BASE[:3], 1)
+    assert open_index(index) is None                  # 查詢端不建索引
+
+    prev, curr = storage.latest_two_snapshots(snaps)
+    idx = update_from_diff(index, prev, curr, diff_snapshots(prev, curr, workers=1))
+    assert idx.snapshot == "snapshot_20250101_000001" and len(idx) == 3
+
+    # 索引已對應這個快照名稱，但快照之後才 clean（內容變了）→ 重跑 diff 要以清理後的內容重建
+    storage.write_clean(_df([("1", "Cleaned Title", "")] + BASE[1:3]), snaps, "snapshot_20250101_000001")
+    prev, curr = storage.latest_two_snapshots(snaps)
+    idx = update_from_diff(index, prev, curr, diff_snapshots(prev, curr, workers=1))
+    assert list(idx.search("cleaned")["pk"]) == ["s::1"]
+    assert open_index(index).version == idx.version
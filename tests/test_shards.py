@@ -0,0 +1,47 @@
+import datetime as real_dt, itertools, types
+import pandas as pd
+from src.pipeline import storage
+from src.pipeline.storage import write_shards, write_snapshot, load_snapshot, compact_snapshots, shard_scheme
+from src.pipeline.diff import diff_snapshots, diff_frames, load_csv
+
+def _frame(i, n=40):
+    rows = [{"source": f"s{k % 3}", "id": str(k), "title": f"T{k}", "price": str(10 + (i if k % 7 == 0 else 0)),
+             "pk": f"s{k % 3}::{k}"} for k in range(i, i + n)]
+    return pd.DataFrame(rows)
+
+def _summary(res):
+    return (sorted(res["new"]["pk"]), sorted(res["deleted"]["pk"]),
+            sorted((c["pk"], sorted(c["diffs"])) for c in res["changed"]))
+
+def test_sharded_diff_matches_single_file(tmp_path):
+    prev, curr = _frame(0), _frame(5)
+    for by, shards in (("pk", 4), ("source", None)):
+        write_shards(prev, tmp_path / by / "a", shards=shards, shard_by=by)
+        write_shards(curr, tmp_path / by / "b", shards=shards, shard_by=by)
+        assert shard_scheme(tmp_path / by / "a") == ((by, shards))
+        res = diff_snapshots(str(tmp_path / by / "a"), str(tmp_path / by / "b"), workers=2)
+        assert _summary(res) == _summary(diff_frames(prev.copy(), curr.copy()))
+        loaded = load_csv(str(tmp_path / by / "b")).sort_values("pk").reset_index(drop=True)
+        pd.testing.assert_frame_equal(loaded, curr.sort_values("pk").reset_index(drop=True))
+
+def test_source_missing_from_one_side(tmp_path):
+    prev, curr = _frame(0), _frame(0)
+    curr = curr[curr["source"] != "s2"]
+    write_shards(prev, tmp_path / "a", shard_by="source")
+    write_shards(curr, tmp_path / "b", shard_by="source")
+    res = diff_snapshots(str(tmp_path / "a"), str(tmp_path / "b"), workers=1)
+    assert set(res["deleted"]["source"]) == {"s2"} and res["new"].empty
+
+def test_sharded_snapshots_in_manifest_and_compaction(tmp_path, monkeypatch):
+    clock = itertools.count()
+    now = lambda: real_dt.datetime(2025, 1, 1) + real_dt.timedelta(seconds=next(clock))
+    monkeypatch.setattr(storage, "dt", types.SimpleNamespace(datetime=types.SimpleNamespace(now=now)))
+    frames = [_frame(i).astype(str) for i in range(4)]
+    for df in frames:
+        write_snapshot(df, str(tmp_path), shards=3)
+    assert compact_snapshots(str(tmp_path), full_every=4)["deltas"] == 1
+    names = storage.list_snapshots(str(tmp_path))
+    for name, df in zip(names, frames):
+        got = load_snapshot(str(tmp_path), name)
+        pd.testing.assert_frame_equal(got.sort_values("pk").reset_index(drop=True),
+                                      df.sort_values("pk").reset_index(drop=True))
@@ -0,0 +1,83 @@
+import pandas as pd, pathlib
+from src.pipeline.storage import (compact_snapshots, load_snapshot, list_snapshots,
+                                  latest_two_snapshots, write_snapshot)
+
+def _snapshots(tmp_path, n=6):
+    frames = {}
+    for i in range(n):
+        rows = [{"source": "s", "id": str(k), "title": f"T{k}", "price": str(10 + k + (i if k == 1 else 0)),
+                 "pk": f"s::{k}"} for k in range(i, i + 5)]
+        df = pd.DataFrame(rows)
+        name = f"snapshot_20250101_00000{i}"
+        df.to_csv(tmp_path / f"{name}.csv", index=False)
+        frames[name] = df.astype(str)
+    return frames
+
+def test_compact_and_reconstruct(tmp_path):
+    frames = _snapshots(tmp_path)
+    stats = compact_snapshots(str(tmp_path), full_every=3)
+    # 最新 2 份保持完整；前 4 份為 full, delta, delta, full
+    assert stats["deltas"] == 2
+    assert len(list(tmp_path.glob("*.delta.json.gz"))) == 2
+    for name, df in frames.items():
+        pd.testing.assert_frame_equal(load_snapshot(str(tmp_path), name), df)
+
+    prev, curr = latest_two_snapshots(str(tmp_path))
+    assert prev.endswith("snapshot_20250101_000004.csv") and curr.endswith("snapshot_20250101_000005.csv")
+
+def test_retention_keeps_newest(tmp_path):
+    frames = _snapshots(tmp_path)
+    compact_snapshots(str(tmp_path), full_every=10)
+    compact_snapshots(str(tmp_path), full_every=10, keep=3)
+    names = list_snapshots(str(tmp_path))
+    assert names == list(frames)[-3:]
+    for name in names:
+        pd.testing.assert_frame_equal(load_snapshot(str(tmp_path), name), frames[name])
+
+def test_write_snapshot_registers_in_manifest(tmp_path):
+    path = write_snapshot(pd.DataFrame([{"source": "s", "id": "1"}]), str(tmp_path))
+    assert (tmp_path / "manifest.json").exists()
+    assert list_snapshots(str(tmp_path)) == [pathlib.Path(path).stem]
+
+def _write_in_child(snap_dir, i):
+    import datetime, time, types
+    from src.pipeline import storage
+    stamp = datetime.datetime(2025, 1, 1, 0, 0, i)
+    storage.dt = types.SimpleNamespace(datetime=types.SimpleNamespace(now=lambda: stamp))
+    load = storage._load_manifest
+    def slow_load(d):
+        m = load(d)
+        time.sleep(0.05)   # 拉長讀取 → 寫回之間的空檔，沒鎖就會互相覆蓋
+        return m
+    storage._load_manifest = slow_load
+    storage.write_snapshot(pd.DataFrame([{"source": "s", "id": str(i)}]), snap_dir)
+
+def test_concurrent_writers_keep_all_manifest_entries(tmp_path):
+    import multiprocessing as mp
+    # 先有 manifest，之後的登記才會走讀取 → 修改 → 寫回（沒有 manifest 時是掃目錄重建）
+    write_snapshot(pd.DataFrame([{"source": "s", "id": "0"}]), str(tmp_path))
+    ctx = mp.get_context("fork")
+    procs = [ctx.Process(target=_write_in_child, args=(str(tmp_path), i)) for i in range(6)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert all(p.exitcode == 0 for p in procs)
+    names = list_snapshots(str(tmp_path))
+    assert len(names) == 7
+    assert sorted(names[1:]) == [f"snapshot_20250101_00000{i}" for i in range(6)]
+
+def test_compaction_keeps_clean_content(tmp_path):
+    from src.pipeline.storage import write_clean
+    frames = _snapshots(tmp_path, n=4)
+    cleaned = {}
+    for name, df in frames.items():
+        cleaned[name] = df.assign(title=df["title"].str.lower())
+        write_clean(cleaned[name], str(tmp_path), name)
+    compact_snapshots(str(tmp_path), full_every=4, keep_full=1)
+    for name, df in cleaned.items():
+        pd.testing.assert_frame_equal(load_snapshot(str(tmp_path), name), df)
+    # 轉成 delta 的快照：原始檔與 clean 檔都刪掉
+    assert sorted(p.name for p in tmp_path.glob("*.csv")) == [
+        "snapshot_20250101_000000.clean.csv", "snapshot_20250101_000000.csv",
+        "snapshot_20250101_000003.clean.csv", "snapshot_20250101_000003.csv"]